@@ -1,76 +1,203 @@
-from flask import Flask, request, jsonify
-from utils.networks.graph import Graph
+from flask import Flask, Response, request, jsonify, g
 from utils.networks.node import Node
-from utils.networks.edge import Edge
+from utils.networks import batch
+from utils.networks.loader import loadGraph
+from utils.networks import snapshot
 from entity.station import Station
 from entity.db import DB
 import json
 from utils.encoder import CustomEncoder
+from utils.cache import RouteCache
+from utils.maps import MapRenderer
+from utils.metrics import Metrics, COUNTS
+from utils.clock import toMinutes, formatMinutes
+from utils.server import serve
+from utils.services import BITS, active
 from datetime import datetime
-import holidays
+import cProfile
+import os
+import threading
+import time
 
 app = Flask(__name__)
 
-def createNodes(db:DB, isWeHolidays):
-    REQUEST_GETALL_STATIONS_BY_WE_HOLIDAYS = """
-        SELECT s.* FROM Station s
-        JOIN Departure d on d.id_src = d.id_src
-        WHERE d.is_we_holidays = ?
-        GROUP BY s.id_station;
-    """
-    db.connect()
-    formatted_bool = 1 if isWeHolidays != "regular" else 0
-    datas = db.execute(REQUEST_GETALL_STATIONS_BY_WE_HOLIDAYS, (formatted_bool,))
-    db.close()
-    return [Node(Station(data[1])) for data in datas]
-
-def createEdges(db:DB, isWeHolidays, nodes):
-    REQUEST_GETALL_STATIONS_BY_WE_HOLIDAYS = """
-        SELECT s1.name, s2.name, l.name, d.src_datetime, d.dest_datetime FROM Departure d
-        JOIN Station s1 on s1.id_station = d.id_src
-        JOIN Station s2 on s2.id_station = d.id_dest
-        JOIN Line l ON l.id_line = d.id_line
-        WHERE d.is_we_holidays = ?;
-    """
-    db.connect()
-    edges = []
-    formatted_bool = 1 if isWeHolidays != "regular" else 0
-    datas = db.execute(REQUEST_GETALL_STATIONS_BY_WE_HOLIDAYS, (formatted_bool,))
-    for data in datas:
-        src = list(filter(lambda node: node.data == data[0] , nodes))[0]
-        dest = list(filter(lambda node: node.data == data[1] , nodes))[0]
-        s_datetime = datetime.strptime(data[3], "%Y-%m-%d %H:%M:%S")
-        d_datetime = datetime.strptime(data[4], "%Y-%m-%d %H:%M:%S")
-        edges += [ Edge(src, dest, [s_datetime, d_datetime, None, data[2]]) ]
-    db.close()
-    return edges
-
-def generateGraphs(db:DB, graphs):
-    for (type, graph) in graphs.items():
-        graph.nodes = createNodes(db, type)
-        graph.edges = createEdges(db, type, graph.nodes)
-
-def isWeHoliday(date):
-    fr_holidays = holidays.France()
-    return date in fr_holidays or date.weekday() in [5, 6] # Saturday or Sunday
+METRICS = Metrics()
+METRICS.describe("http_requests_total", "counter", "Requests answered, by route, method and status")
+METRICS.describe("http_request_duration_seconds", "histogram", "Request latency, by route and method")
+METRICS.describe("routing_phase_seconds", "histogram", "Time spent in each phase of a routing request (search, filter, relax, serialize)")
+METRICS.describe("routing_settled_nodes", "histogram", "Nodes settled by a graph search", COUNTS)
+METRICS.describe("routing_relaxed_edges", "histogram", "Edges relaxed by a graph search", COUNTS)
+METRICS.describe("db_query_seconds", "histogram", "SQLite query latency, by statement")
+METRICS.describe("graph_build_seconds", "gauge", "Duration of each phase of the last full graph build")
+METRICS.describe("graph_builds_total", "counter", "Full graph builds from the database")
+METRICS.describe("graph_update_seconds", "histogram", "Incremental graph updates after a write")
+METRICS.describe("graph_version", "gauge", "Version of the graph in use")
+METRICS.describe("snapshot_load_seconds", "gauge", "Time to map the timetable snapshot at boot")
+METRICS.describe("route_cache", "gauge", "Route cache counters")
+
+# Opt-in profiling : requests slower than PROFILE_SLOW_MS dump their cProfile stats into PROFILE_DIR
+PROFILE_SLOW_MS = float(os.environ.get("PROFILE_SLOW_MS", 0))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "./profiles/")
+
+def generateGraph(db:DB):
+    # Full rebuild from the database, the graph is swapped in once complete
+    global GRAPH
+    (graph, timings) = loadGraph(db)
+    print("Graph loaded : " + ", ".join(f"{phase} {duration * 1000:.1f}ms" for (phase, duration) in timings.items()))
+    for (phase, duration) in timings.items():
+        METRICS.set("graph_build_seconds", duration, phase=phase)
+    METRICS.inc("graph_builds_total")
+    graph.version = GRAPH.version + 1 if GRAPH is not None else 1
+    GRAPH = graph
+    submitMaps(graph)
+    warmHops(graph)
+
+def getGraph():
+    # Loaded at boot without a usable snapshot, otherwise in the background from boot (or by the first request needing it)
+    if GRAPH is None:
+        with GRAPH_LOCK:
+            if GRAPH is None:
+                generateGraph(db)
+    return GRAPH
+
+def getTimetable():
+    # The mapped snapshot answers timetable queries until the graph is loaded
+    if GRAPH is None:
+        return SNAPSHOT["network"]
+    return GRAPH.timetable
+
+def updateGraph(update):
+    # Apply a delta on a copy of the graph, then swap the new version in
+    global GRAPH
+    with GRAPH_LOCK, METRICS.timer("graph_update_seconds"):
+        graph = getGraph().copy()
+        update(graph)
+        GRAPH = graph
+        submitMaps(graph)
+    warmHops(graph)
+
+def warmHops(graph):
+    # The hop matrix is built in the background (once per link set, under its lock), not by the first /shortest request
+    threading.Thread(target=lambda: graph.hops, name="hops", daemon=True).start()
+
+def submitMaps(graph):
+    # One map per service
+    for (service, bit) in BITS.items():
+        MAPS.submit(service, graph, bit)
 
 db = DB("./data/", "database/database.db")
-if input("Do you want to reset/create the database ? (y/n) ") == 'y':
-    db.executeFile("./data/database/schema.sql")
-if input("Do you want to insert the data in txt folder ? (y/n) ") == 'y':
-    db.insertTxtFolder()
-
-GRAPHS = {
-    'regular' : Graph([], []),
-    'we_holidays' : Graph([], [])
-}
-
-generateGraphs(db, GRAPHS)
+db.onQuery = lambda statement, seconds: METRICS.observe("db_query_seconds", seconds, statement=statement)
+
+GRAPH = None # every service in one graph, each edge carries the bitmask of its services
+GRAPH_LOCK = threading.RLock()
+MAPS = None # maps are re-rendered in the background whenever a graph version is swapped in
+BATCH = None # worker processes of /batch
+SNAPSHOT = None
+CACHE = RouteCache(int(os.environ.get("ROUTE_CACHE_SIZE", 4096)))
+
+def boot():
+    # Run from __main__ only : worker processes re-import this module, they must not prompt nor load anything
+    global MAPS, SNAPSHOT, BATCH
+    if input("Do you want to reset/create the database ? (y/n) ") == 'y':
+        db.executeFile("./data/database/schema.sql")
+    if input("Do you want to insert the data in txt folder ? (y/n) ") == 'y':
+        (rows, duration) = db.insertTxtFolder()
+        print(f"Timetable imported : {rows} rows in {duration * 1000:.1f}ms ({rows / max(duration, 1e-9):.0f} rows/s)")
+    for migration in db.migrate("./data/database/migrations/"):
+        print(f"Migration applied : {migration}")
+
+    # Workers started by the first /batch only, 2 unless set (clamped to the cpu count)
+    BATCH = batch.BatchPool((db.folder, db.file), os.environ.get("BATCH_PROCESSES", 2))
+    MAPS = MapRenderer()
+
+    # Compiled with `python -m utils.networks.snapshot`, ignored once the database changed
+    start = time.perf_counter()
+    SNAPSHOT = snapshot.load(os.environ.get("SNAPSHOT", "./data/database/timetable.snapshot"), db.folder + db.file)
+    METRICS.set("snapshot_load_seconds", time.perf_counter() - start)
+    if SNAPSHOT is None:
+        generateGraph(db)
+    else:
+        # The snapshot only serves the timetable engine : the graph of the other engines is built in the background
+        threading.Thread(target=getGraph, name="graph-warmup", daemon=True).start()
+
+@app.before_request
+def startRequest():
+    g.start = time.perf_counter()
+    g.profiler = None
+    if PROFILE_SLOW_MS > 0:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            g.profiler = profiler
+        except ValueError:
+            pass # another profiler is already active
+
+@app.after_request
+def endRequest(response):
+    duration = time.perf_counter() - g.start
+    route = request.url_rule.rule if request.url_rule else "unmatched" # route templates keep the labels few
+    METRICS.observe("http_request_duration_seconds", duration, route=route, method=request.method)
+    METRICS.inc("http_requests_total", route=route, method=request.method, status=response.status_code)
+    if g.profiler is not None:
+        g.profiler.disable()
+        if duration * 1000 >= PROFILE_SLOW_MS:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            name = "".join(c if c.isalnum() else "_" for c in route.strip("/")) or "root"
+            path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{duration * 1000:.0f}ms.prof")
+            g.profiler.dump_stats(path)
+            print(f"Slow request profiled : {request.method} {request.path} {duration * 1000:.1f}ms => {path}")
+    return response
+
+@app.route("/metrics")
+def getMetrics():
+    for (name, value) in CACHE.stats().items():
+        if name != "versions":
+            METRICS.set("route_cache", value, counter=name)
+    if GRAPH is not None:
+        METRICS.set("graph_version", GRAPH.version)
+    return Response(METRICS.render(), mimetype="text/plain; version=0.0.4")
 
 @app.route("/map/<type>")
 def show(type):
-    GRAPHS[type].show()
-    return '<img src="static/assets/map.png" />'
+    if type not in BITS:
+        return jsonify({"error": f"Unknown service {type}"}), 404
+    return f'<img src="/map/{type}/image" />'
+
+@app.route("/map/<type>/image")
+def showImage(type):
+    if type not in BITS:
+        return jsonify({"error": f"Unknown service {type}"}), 404
+    MAPS.submit(type, getGraph(), BITS[type])
+    # Latest rendered version : only the first render of a graph type is waited for
+    rendered = MAPS.get(type, timeout=float(os.environ.get("MAP_TIMEOUT", 30)))
+    if rendered is None:
+        return jsonify({"error": "Map not rendered yet"}), 503
+    (version, image) = rendered
+    response = Response(image, mimetype="image/png")
+    response.set_etag(f"{type}-{version}")
+    response.cache_control.no_cache = True # always revalidated, answered by a 304 while the version is unchanged
+    return response.make_conditional(request)
+
+def filterQuery(request, filter_params, size=None):
+    # Listing statement : the filters given a value are AND-ed, then the keyset order and the page size.
+    # utils.queryplan checks the statements built here, as the endpoints run them
+    query = ""
+    query_params = []
+    for param in filter_params["params"].values():
+        if param["value"] is None:
+            continue
+        query += " AND " if query else "WHERE "
+        query_params.extend(param["value"] if isinstance(param["value"], tuple) else [param["value"]])
+        query += param["request"]
+    request += f"{query}\nORDER BY {filter_params['order']}"
+    if size is not None:
+        request += "\nLIMIT ?"
+        query_params.append(size)
+    return (request + ";", query_params)
+
+def streamRows(rows, toDict):
+    # NDJSON, one line per row as SQLite produces it
+    return Response((json.dumps(toDict(row), cls=CustomEncoder, ensure_ascii=False) + "\n" for row in rows), mimetype='application/x-ndjson')
 
 # CRUD Station
 
@@ -79,9 +206,7 @@ def getAllStations():
     REQUEST_GETALL_STATIONS = """
         SELECT * FROM Station;
     """
-    db.connect()
     datas = db.execute(REQUEST_GETALL_STATIONS, ())
-    db.close()
     return json.dumps([Station(data[1]) for data in datas], cls=CustomEncoder, ensure_ascii=False).encode('utf-8')
 
 @app.route("/station/<name>")
@@ -91,13 +216,10 @@ def getStation(name:str):
         WHERE name = ?;
     """
     try:
-        db.connect()
         data = db.execute(REQUEST_GET_STATIONS, (name,), type="one")
         if data is None:
             return jsonify({"error": f"Station not found"}), 404
         station = Station(data[1])
-        db.conn.commit()
-        db.close()
     except KeyError as e:
         return jsonify({"error": f"Missing key : {e}"}), 500
     except Exception as e:
@@ -111,11 +233,9 @@ def postStation():
     """
     try:
         data = request.get_json()
-        db.connect()
-        db.execute(REQUEST_INSERT_STATION, (data["name"],))
-        db.conn.commit()
-        db.close()
-        generateGraphs(db, GRAPHS)
+        with db.transaction():
+            db.execute(REQUEST_INSERT_STATION, (data["name"],))
+        updateGraph(lambda graph: graph.addNode(Node(Station(data["name"]))))
     except KeyError as e:
         return jsonify({"error": f"Missing key : {e}"}), 500
     except Exception as e:
@@ -129,11 +249,9 @@ def updateStation():
     """
     try:
         data = request.get_json()
-        db.connect()
-        db.execute(REQUEST_INSERT_STATION, (data["updated_name"],data["name"],))
-        db.conn.commit()
-        db.close()
-        generateGraphs(db, GRAPHS)
+        with db.transaction():
+            db.execute(REQUEST_INSERT_STATION, (data["updated_name"],data["name"],))
+        updateGraph(lambda graph: graph.renameNode(Node(Station(data["name"])), Station(data["updated_name"])))
     except KeyError as e:
         return jsonify({"error": f"Missing key : {e}"}), 500
     except Exception as e:
@@ -145,7 +263,7 @@ def deleteStation():
     try:
         data = request.get_json()
         db.executeFile("./data/database/script/deleteStation.sql", (data["name"],data["name"], data["name"], data["name"]))
-        generateGraphs(db, GRAPHS)
+        updateGraph(lambda graph: graph.removeNode(Node(Station(data["name"]))))
     except KeyError as e:
         return jsonify({"error": f"Missing key : {e}"}), 500
     except Exception as e:
@@ -159,9 +277,7 @@ def getAllLines():
     REQUEST_GETALL_LINES = """
         SELECT * FROM Line;
     """
-    db.connect()
     datas = db.execute(REQUEST_GETALL_LINES, ())
-    db.close()
     return json.dumps([{ "name" : data[1] } for data in datas], cls=CustomEncoder, ensure_ascii=False).encode('utf-8')
 
 @app.route("/line/<name>")
@@ -171,12 +287,10 @@ def getLine(name:str):
         WHERE name = ?;
     """
     try:
-        db.connect()
         data = db.execute(REQUEST_GET_LINE, (name,), type="one")
         if data is None:
             return jsonify({"error": f"Station not found"}), 404
         line = { "name" : data[1] }
-        db.close()
     except KeyError as e:
         return jsonify({"error": f"Missing key : {e}"}), 500
     except Exception as e:
@@ -190,10 +304,8 @@ def postLine():
     """
     try:
         data = request.get_json()
-        db.connect()
-        db.execute(REQUEST_POST_LINE, (data["name"],))
-        db.conn.commit()
-        db.close()
+        with db.transaction():
+            db.execute(REQUEST_POST_LINE, (data["name"],))
     except KeyError as e:
         return jsonify({"error": f"Missing key : {e}"}), 500
     except Exception as e:
@@ -207,11 +319,9 @@ def updateLine():
     """
     try:
         data = request.get_json()
-        db.connect()
-        db.execute(REQUEST_UPDATE_LINE, (data["updated_name"],data["name"],))
-        db.conn.commit()
-        db.close()
-        generateGraphs(db, GRAPHS)
+        with db.transaction():
+            db.execute(REQUEST_UPDATE_LINE, (data["updated_name"],data["name"],))
+        updateGraph(lambda graph: graph.renameLine(data["name"], data["updated_name"]))
     except KeyError as e:
         return jsonify({"error": f"Missing key : {e}"}), 500
     except Exception as e:
@@ -223,7 +333,7 @@ def deleteLine():
     try:
         data = request.get_json()
         db.executeFile("./data/database/script/deleteLine.sql", (data["name"],data["name"], data["name"]))
-        generateGraphs(db, GRAPHS)
+        updateGraph(lambda graph: graph.removeLine(data["name"]))
     except KeyError as e:
         return jsonify({"error": f"Missing key : {e}"}), 500
     except Exception as e:
@@ -235,7 +345,7 @@ def deleteLine():
 @app.route("/departures")
 def getAllDepartures():
     REQUEST_GETALL_DEPARTURES = """
-        SELECT s1.name, s2.name, l.name, d.src_datetime, d.dest_datetime, d.is_we_holidays FROM Departure d
+        SELECT s1.name, s2.name, l.name, d.src_datetime, d.dest_datetime, d.is_we_holidays, d.id_depature FROM Departure d
         JOIN Station s1 ON s1.id_station = d.id_src
         JOIN Station s2 ON s2.id_station = d.id_dest
         JOIN Line l ON l.id_line = d.id_line
@@ -265,33 +375,23 @@ def getAllDepartures():
             "line" : {
                 "value" : request.args.get('line', default=None, type=str),
                 "request" : "l.name = ?"
+            },
+            "after" : {
+                "value" : request.args.get('after', default=None, type=int),
+                "request" : "d.id_depature > ?" # keyset cursor : id of the last departure already read
             }
         },
-        "query" : ""
+        "order" : "d.id_depature" # the next page starts after the last id of this one
     }
-    query_params = []
-    for param in filter_params["params"].values():
-        if param["value"] is None:
-            continue
-        if not filter_params["query"]:
-            filter_params["query"] += "WHERE "
-        if not filter_params["query"].endswith(" ") :
-            filter_params["query"] += " AND "
-        query_params.append(param["value"])
-        filter_params["query"] += param["request"]
-
-    REQUEST_GETALL_DEPARTURES += filter_params["query"]
-    REQUEST_GETALL_DEPARTURES += "\nLIMIT ?;"
-    size = request.args.get('size', default=100, type=int)
-    query_params.append(size)
-
-    db.connect()
+    stream = request.args.get('format', default="json", type=str) == "ndjson"
+    size = request.args.get('size', default=None if stream else 100, type=int)
+    (REQUEST_GETALL_DEPARTURES, query_params) = filterQuery(REQUEST_GETALL_DEPARTURES, filter_params, size)
+
+    toDict = lambda data: { "id" : data[6], "src" : data[0], "dest" : data[1], "line" : data[2], "src_datetime" : data[3], "dest_datetime" : data[4], "is_we_holidays" : data[5] == 1 }
+    if stream:
+        return streamRows(db.iterate(REQUEST_GETALL_DEPARTURES, query_params), toDict)
     datas = db.execute(REQUEST_GETALL_DEPARTURES, query_params)
-    db.close()
-    return json.dumps([
-        { "src" : data[0], "dest" : data[1], "line" : data[2], "src_datetime" : data[3], "dest_datetime" : data[4], "is_we_holidays" : data[5] == 1 }
-        for data in datas
-    ], cls=CustomEncoder, ensure_ascii=False).encode('utf-8')
+    return json.dumps([toDict(data) for data in datas], cls=CustomEncoder, ensure_ascii=False).encode('utf-8')
 
 @app.route("/departure/<src>/<dest>/<line>/<hour_src>/<hour_dest>/<is_we_holidays>")
 def getDeparture(src:str, dest:str, line:str, hour_src:str, hour_dest:str, is_we_holidays:str):
@@ -305,7 +405,6 @@ def getDeparture(src:str, dest:str, line:str, hour_src:str, hour_dest:str, is_we
     hour_src = datetime.strptime(hour_src, "%H:%M")
     hour_dest = datetime.strptime(hour_dest, "%H:%M")
     try:
-        db.connect()
         data = db.execute(REQUEST_GET_DEPARTURE, (src, dest, line, hour_src, hour_dest, is_we_holidays,)
                           , type="one")
         if data is None:
@@ -318,7 +417,6 @@ def getDeparture(src:str, dest:str, line:str, hour_src:str, hour_dest:str, is_we
             "end" : data[4],
             "we_holidays" : data[5],
         }
-        db.close()
     except KeyError as e:
         return jsonify({"error": f"Missing key : {e}"}), 500
     except Exception as e:
@@ -341,10 +439,13 @@ def postDeparture():
         data = request.get_json()
         start = datetime.strptime(data["start"], "%H:%M")
         end = datetime.strptime(data["end"], "%H:%M")
-        db.connect()
-        db.execute(REQUEST_POST_DEPARTURE, (data["src"], data["dest"], data["line"], start, end, data["is_holydays"]))
-        db.conn.commit()
-        db.close()
+        with db.transaction():
+            db.execute(REQUEST_POST_DEPARTURE, (data["src"], data["dest"], data["line"], start, end, data["is_holydays"]))
+        def addDeparture(graph):
+            (src, dest) = (graph.getNode(data["src"]), graph.getNode(data["dest"]))
+            if src is not None and dest is not None:
+                graph.addServices(src, dest, [toMinutes(start), toMinutes(end), None, data["line"]], BITS['we_holidays' if data["is_holydays"] else 'regular'])
+        updateGraph(addDeparture)
     except KeyError as e:
         return jsonify({"error": f"Missing key : {e}"}), 500
     except Exception as e:
@@ -366,10 +467,12 @@ def deleteDeparture():
         data = request.get_json()
         start = datetime.strptime(data["start"], "%H:%M")
         end = datetime.strptime(data["end"], "%H:%M")
-        db.connect()
-        db.execute(REQUEST_DELETE_DEPARTURE, (data["src"], data["dest"], data["line"], start, end, data["is_holydays"]))
-        db.conn.commit()
-        db.close()
+        with db.transaction():
+            db.execute(REQUEST_DELETE_DEPARTURE, (data["src"], data["dest"], data["line"], start, end, data["is_holydays"]))
+        def removeDeparture(graph):
+            weight = [toMinutes(start), toMinutes(end), None, data["line"]]
+            graph.removeServices(Node(Station(data["src"])), Node(Station(data["dest"])), weight, BITS['we_holidays' if data["is_holydays"] else 'regular'])
+        updateGraph(removeDeparture)
     except KeyError as e:
         return jsonify({"error": f"Missing key : {e}"}), 500
     except Exception as e:
@@ -381,10 +484,16 @@ def deleteDeparture():
 @app.route("/passs")
 def getAllPasss():
     REQUEST_GETALL_PASS = """
-        SELECT s.name, l.name, p.number FROM Pass p
+        SELECT s.name, l.name, p.number, p.id_line, p.id_station FROM Pass p
         JOIN Station s on s.id_station = p.id_station
         JOIN Line l ON l.id_line = p.id_line
     """
+    # Keyset cursor : "<id_line>-<id_station>" of the last pass already read, the id of each pass
+    after = request.args.get('after', default=None, type=str)
+    try:
+        after = tuple(int(id) for id in after.split("-", 1)) if after else None
+    except ValueError:
+        return jsonify({"error": "Wrong parameters", "message": f"Wrong cursor {request.args.get('after')}"}), 400
     filter_params = {
         "params" : {
             "station" : {
@@ -394,27 +503,23 @@ def getAllPasss():
             "line" : {
                 "value" : request.args.get('line', default=None, type=str),
                 "request" : "l.name = ?"
+            },
+            "after" : {
+                "value" : after,
+                "request" : "(p.id_line, p.id_station) > (?, ?)"
             }
         },
-        "query" : ""
+        "order" : "p.id_line, p.id_station" # Pass has no integer key : pages follow this index, which never renumbers
     }
-    query_params = []
-    for param in filter_params["params"].values():
-        if param["value"] is None:
-            continue
-        if not filter_params["query"]:
-            filter_params["query"] += "WHERE "
-        if not filter_params["query"].endswith(" ") :
-            filter_params["query"] += " AND "
-        query_params.append(param["value"])
-        filter_params["query"] += param["request"]
+    stream = request.args.get('format', default="json", type=str) == "ndjson"
+    size = request.args.get('size', default=None, type=int)
+    (REQUEST_GETALL_PASS, query_params) = filterQuery(REQUEST_GETALL_PASS, filter_params, size)
 
-    REQUEST_GETALL_PASS += f"{filter_params['query']};"
-
-    db.connect()
+    toDict = lambda data: { "id" : f"{data[3]}-{data[4]}", "station" : data[0], "line" : data[1], "index" : data[2] }
+    if stream:
+        return streamRows(db.iterate(REQUEST_GETALL_PASS, query_params), toDict)
     datas = db.execute(REQUEST_GETALL_PASS, query_params)
-    db.close()
-    return json.dumps([{ "station" : data[0], "line" : data[1], "index" : data[2] } for data in datas], cls=CustomEncoder, ensure_ascii=False).encode('utf-8')
+    return json.dumps([toDict(data) for data in datas], cls=CustomEncoder, ensure_ascii=False).encode('utf-8')
 
 @app.route("/pass/<station>/<line>")
 def getPass(station:str, line:str):
@@ -425,13 +530,11 @@ def getPass(station:str, line:str):
         WHERE s.name = ? AND l.name = ?;
     """
     try:
-        db.connect()
         data = db.execute(REQUEST_GET_PASS, (station, line,)
                           , type="one")
         if data is None:
             return jsonify({"error": f"Pass not found"}), 404
         object = { "station" : data[0], "line" : data[1], "index" : data[2] }
-        db.close()
     except KeyError as e:
         return jsonify({"error": f"Missing key : {e}"}), 500
     except Exception as e:
@@ -447,9 +550,7 @@ def getAllTravels():
         JOIN Station s on s.id_station = p.id_station
         JOIN Line l ON l.id_line = p.id_line;
     """
-    db.connect()
     datas = db.execute(REQUEST_GETALL_TRAVELS, ())
-    db.close()
     travels = {}
     for data in datas:
         if not travels.get(data[1]):
@@ -463,43 +564,185 @@ def getAllTravels():
         travels[line] = [path, path[::-1]]
     return json.dumps(travels, cls=CustomEncoder, ensure_ascii=False).encode('utf-8')
 
+ALGORITHMS = {
+    "djikstra" : ["shortest", "fastest", "foremost"],
+    "astar" : ["shortest", "fastest", "foremost"],
+    "csa" : ["fastest", "foremost"],
+    "timetable" : ["shortest", "fastest", "foremost"]
+}
+
 def AlgoParameters(data):
     start = datetime.strptime(data["datetime"],'%d/%m/%Y %H:%M')
-    graphType = 'regular'
-    if (isWeHoliday(start)):
-        graphType = 'we_holidays'
+    services = active(start.date()) # bitmask of the services running that day, cached per date
 
-    srcNode = GRAPHS[graphType].getNode(data["src"])
-    destNode = GRAPHS[graphType].getNode(data["dest"])
-    time_only = datetime.strptime(start.strftime('%H:%M'), '%H:%M')
-    return (srcNode, destNode, time_only, graphType)
+    source = getTimetable() if data.get("engine") == "timetable" else getGraph()
+    srcNode = source.getNode(data["src"])
+    destNode = source.getNode(data["dest"])
+    time_only = toMinutes(start)
+    return (srcNode, destNode, time_only, services)
 
-@app.route("/shortest", methods = ['POST'])
-def getShortest():
+def routeRequest(algorithm):
     data = request.get_json()
-    (srcNode, destNode, time_only, graphType) = AlgoParameters(data)
+    (srcNode, destNode, time_only, services) = AlgoParameters(data)
     if (srcNode == None or destNode == None): # Error wrong parameters
         return jsonify({"error": "Wrong parameters", "message": "Source or destination doesn't exists"}), 400
 
-    edges = GRAPHS[graphType].shortest(srcNode, destNode, time_only)
-    return json.dumps(edges, cls=CustomEncoder, ensure_ascii=False).encode('utf-8')
+    engine = data.get("engine", "djikstra")
+    if algorithm not in ALGORITHMS.get(engine, []):
+        return jsonify({"error": "Wrong parameters", "message": f"Unknown engine {engine} for {algorithm}"}), 400
+
+    graph = getTimetable() if engine == "timetable" else getGraph()
+    key = (services, algorithm, engine, srcNode.data.name, destNode.data.name, time_only)
+    result = CACHE.get(key, graph.version)
+    headers = {}
+    if result is None:
+        labels = { "algorithm" : algorithm, "engine" : engine }
+        start = time.perf_counter()
+        stats = {} # search effort, to measure the pruning
+        edges = graph.route(algorithm, engine, srcNode, destNode, time_only, services, stats)
+        if engine in ["djikstra", "astar"]:
+            headers = { "X-Settled-Nodes" : stats.get("settled", 0), "X-Relaxed-Edges" : stats.get("relaxed", 0) }
+            METRICS.observe("routing_settled_nodes", stats.get("settled", 0), **labels)
+            METRICS.observe("routing_relaxed_edges", stats.get("relaxed", 0), **labels)
+            METRICS.observe("routing_phase_seconds", stats.get("filter_seconds", 0), phase="filter", **labels)
+            METRICS.observe("routing_phase_seconds", stats.get("relax_seconds", 0), phase="relax", **labels)
+        METRICS.observe("routing_phase_seconds", time.perf_counter() - start, phase="search", **labels)
+        with METRICS.timer("routing_phase_seconds", phase="serialize", **labels):
+            result = json.dumps(edges, cls=CustomEncoder, ensure_ascii=False).encode('utf-8')
+        CACHE.put(key, graph.version, result)
+    return result, 200, headers
+
+@app.route("/shortest", methods = ['POST'])
+def getShortest():
+    return routeRequest("shortest")
 
 @app.route("/fastest", methods = ['POST'])
 def getFastest():
+    return routeRequest("fastest")
+
+@app.route("/pareto", methods = ['POST'])
+def getPareto():
     data = request.get_json()
-    (srcNode, destNode, time_only, graphType) = AlgoParameters(data)
+    try:
+        (srcNode, destNode, time_only, services) = AlgoParameters(data)
+        max_transfers = int(data.get("max_transfers", 4))
+    except KeyError as e:
+        return jsonify({"error": f"Missing key : {e}"}), 400
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": "Wrong parameters", "message": f"{e}"}), 400
     if (srcNode == None or destNode == None): # Error wrong parameters
         return jsonify({"error": "Wrong parameters", "message": "Source or destination doesn't exists"}), 400
 
-    edges = GRAPHS[graphType].fastest(srcNode, destNode, time_only)
-    return json.dumps(edges, cls=CustomEncoder, ensure_ascii=False).encode('utf-8')
+    journeys = getGraph().raptor.pareto(srcNode, destNode, time_only, max_transfers, services)
+    return json.dumps([
+        { "transfers" : journey["transfers"], "arrival" : formatMinutes(journey["arrival"]), "journey" : journey["journey"] }
+        for journey in journeys
+    ], cls=CustomEncoder, ensure_ascii=False).encode('utf-8')
 
-@app.route("/foremost", methods = ['POST'])
-def getForemost():
+@app.route("/profile", methods = ['POST'])
+def getProfile():
     data = request.get_json()
-    (srcNode, destNode, time_only, graphType) = AlgoParameters(data)
+    try:
+        (srcNode, destNode, time_only, services) = AlgoParameters(data)
+        until = toMinutes(datetime.strptime(data["until"], '%H:%M'))
+    except KeyError as e:
+        return jsonify({"error": f"Missing key : {e}"}), 400
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": "Wrong parameters", "message": f"{e}"}), 400
     if (srcNode == None or destNode == None): # Error wrong parameters
         return jsonify({"error": "Wrong parameters", "message": "Source or destination doesn't exists"}), 400
 
-    edges = GRAPHS[graphType].foremost(srcNode, destNode, time_only)
-    return json.dumps(edges, cls=CustomEncoder, ensure_ascii=False).encode('utf-8')
\ No newline at end of file
+    journeys = getGraph().csa.profile(srcNode, destNode, time_only, until, services)
+    return json.dumps([
+        { "departure" : formatMinutes(journey["departure"]), "arrival" : formatMinutes(journey["arrival"]), "journey" : journey["journey"] }
+        for journey in journeys
+    ], cls=CustomEncoder, ensure_ascii=False).encode('utf-8')
+
+@app.route("/foremost", methods = ['POST'])
+def getForemost():
+    return routeRequest("foremost")
+
+@app.route("/isochrone", methods = ['POST'])
+def getIsochrone():
+    data = request.get_json()
+    try:
+        start = datetime.strptime(data["datetime"],'%d/%m/%Y %H:%M')
+        budget = int(data["budget"]) if data.get("budget") is not None else None # minutes, every reachable station when missing
+        graph = getGraph()
+        srcNode = graph.getNode(data["src"])
+    except KeyError as e:
+        return jsonify({"error": f"Missing key : {e}"}), 400
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": "Wrong parameters", "message": f"{e}"}), 400
+    if budget is not None and budget < 0:
+        return jsonify({"error": "Wrong parameters", "message": "Negative budget"}), 400
+    if srcNode == None: # Error wrong parameters
+        return jsonify({"error": "Wrong parameters", "message": "Source doesn't exists"}), 400
+
+    # Earliest arrival at every reachable station, from a single one-to-all search
+    (services, time_only) = (active(start.date()), toMinutes(start))
+    key = (services, "isochrone", "djikstra", srcNode.data.name, budget, time_only)
+    result = CACHE.get(key, graph.version)
+    headers = {}
+    if result is None:
+        stats = {}
+        arrivals = graph.isochrone(srcNode, time_only, budget, stats, services)
+        headers = { "X-Settled-Nodes" : stats.get("settled", 0), "X-Relaxed-Edges" : stats.get("relaxed", 0) }
+        METRICS.observe("routing_settled_nodes", stats.get("settled", 0), algorithm="isochrone", engine="djikstra")
+        METRICS.observe("routing_relaxed_edges", stats.get("relaxed", 0), algorithm="isochrone", engine="djikstra")
+        result = json.dumps([
+            { "station" : node.data, "arrival" : formatMinutes(arrival), "duration" : arrival - time_only }
+            for (node, arrival) in sorted(arrivals.items(), key=lambda item: (item[1], item[0].data.name))
+        ], cls=CustomEncoder, ensure_ascii=False).encode('utf-8')
+        CACHE.put(key, graph.version, result)
+    return result, 200, headers
+
+@app.route("/board/<station>")
+def getBoard(station:str):
+    # Next departures from a station by line and direction, answered from the in-memory index of the graph version
+    try:
+        when = request.args.get('datetime', default=None, type=str)
+        start = datetime.strptime(when, '%d/%m/%Y %H:%M') if when else datetime.now()
+    except ValueError as e:
+        return jsonify({"error": "Wrong parameters", "message": f"{e}"}), 400
+    count = request.args.get('count', default=5, type=int)
+    graph = getGraph()
+    node = graph.getNode(station)
+    if node is None:
+        return jsonify({"error": "Station not found"}), 404
+
+    board = graph.board.next(node, toMinutes(start), active(start.date()), count)
+    return json.dumps([
+        { "line" : line, "direction" : terminus, "departures" : [{ "time" : formatMinutes(edge.weight[0]), "next" : edge.dest.data.name } for edge in departures] }
+        for (line, terminus, departures) in board
+    ], cls=CustomEncoder, ensure_ascii=False).encode('utf-8')
+
+@app.route("/cache")
+def getCacheStats():
+    return jsonify(CACHE.stats()), 200
+
+@app.route("/batch", methods = ['POST'])
+def getBatch():
+    data = request.get_json()
+    queries = []
+    try:
+        for query in data["queries"]:
+            (srcNode, destNode, time_only, services) = AlgoParameters(query)
+            if (srcNode == None or destNode == None): # Error wrong parameters
+                return jsonify({"error": "Wrong parameters", "message": f"Source or destination doesn't exists : {query}"}), 400
+            engine = query.get("engine", data.get("engine", "djikstra"))
+            algorithm = query.get("algorithm", data.get("algorithm", "fastest"))
+            if algorithm not in ALGORITHMS.get(engine, []):
+                return jsonify({"error": "Wrong parameters", "message": f"Unknown algorithm {algorithm} for engine {engine}"}), 400
+            queries.append((services, algorithm, engine, srcNode, destNode, time_only))
+    except KeyError as e:
+        return jsonify({"error": f"Missing key : {e}"}), 400
+
+    # One JSON result per line, in the order of the queries
+    results = BATCH.run(getGraph(), queries)
+    return Response((json.dumps(edges, cls=CustomEncoder, ensure_ascii=False) + "\n" for edges in results), mimetype='application/x-ndjson')
+
+if __name__ == "__main__":
+    # python api.py : threaded server, the graph is shared read-only between the request threads
+    boot()
+    serve(app, os.environ.get("HOST", "127.0.0.1"), int(os.environ.get("PORT", 5000)), int(os.environ.get("WORKERS", 8)))
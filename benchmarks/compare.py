@@ -0,0 +1,37 @@
+import json
+import sys
+
+# Ratio after / before of every timing and memory figure of two benchmark runs
+#   python -m benchmarks.compare before.json after.json [threshold]
+# Exits with 1 when a figure got slower or bigger than `threshold` (default 1.2, i.e. +20%)
+
+def figures(result):
+    # "section.name" => value, for the measured figures only
+    values = {}
+    for (section, content) in result.items():
+        if section == "algorithms":
+            values.update({f"algorithms.{name}" : stats["mean_ms"] for (name, stats) in content.items()})
+        elif section in ["build", "memory"]:
+            values.update({f"{section}.{name}" : value for (name, value) in content.items()})
+        elif section == "import":
+            values.update({f"import.{name}" : content[name] for name in ["insert_ms", "migrate_ms"]})
+    return values
+
+if __name__ == "__main__":
+    with open(sys.argv[1]) as f:
+        before = json.load(f)
+    with open(sys.argv[2]) as f:
+        after = json.load(f)
+    threshold = float(sys.argv[3]) if len(sys.argv) > 3 else 1.2
+    if before.get("parameters") != after.get("parameters"):
+        print(f"Warning : different parameters {before.get('parameters')} / {after.get('parameters')}")
+
+    (old, new) = (figures(before), figures(after))
+    regressions = 0
+    for name in sorted(set(old) & set(new)):
+        ratio = new[name] / old[name] if old[name] else 1
+        regressed = ratio > threshold
+        regressions += regressed
+        print(f"{'!' if regressed else ' '} {name:<32} {old[name]:>14.2f} {new[name]:>14.2f} {ratio:>7.2f}x")
+    print(f"{regressions} regression(s) above {threshold}x")
+    sys.exit(1 if regressions > 0 else 0)
@@ -0,0 +1,58 @@
+import os
+import random
+import sys
+
+# Synthetic network in the data/txt format, one file per line :
+#   regular path, regular go, regular back, we/holidays path, we/holidays go, we/holidays back
+# python -m benchmarks.generate [folder] [lines] [stations] [trips] [seed]
+
+FIRST_DEPARTURE = 5 * 60 + 30
+LAST_DEPARTURE = 20 * 60
+MAX_STOPS = 40 # rides take at most 4 minutes : the last trips end before midnight
+SKIP = 0.05 # share of intermediate stops a trip doesn't serve
+
+def formatHour(minutes):
+    return f"{minutes // 60}:{minutes % 60:02d}"
+
+def dates(path, rides, trips, generator):
+    # "STATION h1 h2 ..." per stop, '-' where the bus doesn't stop
+    columns = []
+    step = (LAST_DEPARTURE - FIRST_DEPARTURE) // max(1, trips)
+    for trip in range(trips):
+        time = FIRST_DEPARTURE + trip * step + generator.randrange(step or 1)
+        column = []
+        for (i, ride) in enumerate([0] + rides):
+            time += ride
+            skipped = 0 < i < len(path) - 1 and generator.random() < SKIP
+            column.append('-' if skipped else formatHour(time))
+        columns.append(column)
+    return "\n".join(f"{station} " + " ".join(column[i] for column in columns) for (i, station) in enumerate(path))
+
+def line(number, stations, length, trips, generator):
+    # Returns (file name, content), the way back serves the same stops in reverse order
+    path = generator.sample(stations, length)
+    rides = [generator.randint(1, 4) for _ in range(length - 1)] # same ride times on every trip
+    sections = []
+    for weTrips in [trips, max(1, trips // 2)]:
+        sections.append(" N ".join(path))
+        sections.append(dates(path, rides, weTrips, generator))
+        sections.append(dates(path[::-1], rides[::-1], weTrips, generator))
+    return (f"{number}_{path[0]}-{path[-1]}.txt", "\n\n".join(sections))
+
+def generate(folder, lines=50, stations=1000, trips=40, seed=631):
+    # Writes folder/txt/*.txt, returns the number of departures the import will create
+    generator = random.Random(seed)
+    names = [f"STATION_{i:05d}" for i in range(stations)]
+    length = max(3, min(stations, MAX_STOPS, 2 * stations // max(1, lines) + 2)) # every station served about twice
+    os.makedirs(os.path.join(folder, "txt"), exist_ok=True)
+    for number in range(1, lines + 1):
+        (name, content) = line(number, names, length, trips, generator)
+        with open(os.path.join(folder, "txt", name), "w", encoding="utf-8") as f:
+            f.write(content)
+    return lines * (length - 1) * 2 * (trips + max(1, trips // 2))
+
+if __name__ == "__main__":
+    folder = sys.argv[1] if len(sys.argv) > 1 else "./benchmarks/data/"
+    values = [int(value) for value in sys.argv[2:6]]
+    departures = generate(folder, *values)
+    print(f"Network written to {folder}txt/ (about {departures} departures)")
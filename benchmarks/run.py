@@ -0,0 +1,124 @@
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from api import ALGORITHMS
+from benchmarks.generate import generate
+from entity.db import DB
+from utils.networks.loader import loadGraph
+from utils.networks.timetable import Timetable
+from utils.services import BITS
+
+# Times the import, the graph build and every routing engine on a generated network, plus the peak
+# memory of the import and of the build. One JSON document is written, to compare two commits run
+#   python -m benchmarks.run [lines] [stations] [trips] [queries] [output]
+#   python -m benchmarks.compare before.json after.json
+
+SCHEMA = "./data/database/schema.sql"
+MIGRATIONS = "./data/database/migrations/"
+
+def percentile(values, ratio):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(ratio * len(values)))] if len(values) > 0 else None
+
+def summary(durations):
+    # Seconds => milliseconds statistics
+    return {
+        "count" : len(durations),
+        "total_ms" : sum(durations) * 1000,
+        "mean_ms" : sum(durations) * 1000 / max(1, len(durations)),
+        "p50_ms" : percentile(durations, 0.5) * 1000 if durations else None,
+        "p95_ms" : percentile(durations, 0.95) * 1000 if durations else None,
+        "max_ms" : max(durations) * 1000 if durations else None
+    }
+
+def peak(function):
+    # (result, peak bytes allocated by Python while it runs), timings are taken in a separate untraced run
+    tracemalloc.start()
+    try:
+        result = function()
+        return (result, tracemalloc.get_traced_memory()[1])
+    finally:
+        tracemalloc.stop()
+
+def database(folder):
+    db = DB(folder, "database/benchmark.db")
+    for suffix in ["", "-wal", "-shm"]:
+        if os.path.exists(db.folder + db.file + suffix):
+            os.remove(db.folder + db.file + suffix)
+    os.makedirs(os.path.join(folder, "database"), exist_ok=True)
+    db.executeFile(SCHEMA)
+    return db
+
+def commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(lines=50, stations=1000, trips=40, queries=50, seed=631):
+    folder = tempfile.mkdtemp(prefix="bus-benchmark-") + "/"
+    try:
+        start = time.perf_counter()
+        departures = generate(folder, lines, stations, trips, seed)
+        result = {
+            "commit" : commit(),
+            "python" : platform.python_version(),
+            "parameters" : { "lines" : lines, "stations" : stations, "trips" : trips, "queries" : queries, "seed" : seed },
+            "generate_ms" : (time.perf_counter() - start) * 1000
+        }
+
+        # Import : bulk insert, then the index migrations
+        db = database(folder)
+        (rows, duration) = db.insertTxtFolder()
+        start = time.perf_counter()
+        db.migrate(MIGRATIONS)
+        result["import"] = { "rows" : rows, "estimated_departures" : departures, "insert_ms" : duration * 1000, "rows_per_s" : rows / max(duration, 1e-9), "migrate_ms" : (time.perf_counter() - start) * 1000 }
+
+        # Graph build : loader phases, then the lazily built engines
+        (graph, timings) = loadGraph(db)
+        result["build"] = { phase : duration * 1000 for (phase, duration) in timings.items() }
+        for engine in ["csa", "raptor", "timetable", "hops"]:
+            start = time.perf_counter()
+            getattr(graph, engine)
+            result["build"][engine] = (time.perf_counter() - start) * 1000
+
+        # Routing : the same seeded queries for every engine, on the regular service
+        generator = random.Random(seed)
+        samples = [(generator.choice(graph.nodes), generator.choice(graph.nodes), generator.randrange(6 * 60, 20 * 60)) for _ in range(queries)]
+        result["algorithms"] = {}
+        for (engine, algorithm) in [(engine, algorithm) for (engine, algorithms) in ALGORITHMS.items() for algorithm in algorithms] + [("raptor", "pareto")]:
+            durations = []
+            for (src, dest, minutes) in samples:
+                start = time.perf_counter()
+                graph.route(algorithm, engine, src, dest, minutes, BITS["regular"])
+                durations.append(time.perf_counter() - start)
+            result["algorithms"][f"{engine}.{algorithm}"] = summary(durations)
+
+        # Peak Python memory, traced apart from the timed runs
+        db.close()
+        db = database(folder)
+        (_, importPeak) = peak(lambda: db.insertTxtFolder(processes=1))
+        (_, buildPeak) = peak(lambda: loadGraph(db))
+        (_, timetablePeak) = peak(lambda: Timetable(graph.edges))
+        result["memory"] = { "import_peak_bytes" : importPeak, "build_peak_bytes" : buildPeak, "timetable_peak_bytes" : timetablePeak }
+        db.close()
+        return result
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+if __name__ == "__main__":
+    values = [int(value) for value in sys.argv[1:5]]
+    output = sys.argv[5] if len(sys.argv) > 5 else None
+    result = run(*values)
+    content = json.dumps(result, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(content)
+    print(content)
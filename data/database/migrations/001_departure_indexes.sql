@@ -0,0 +1,10 @@
+-- Lookups of Departure by station, line or hour (filters of /departures, getDeparture,
+-- deleteDeparture, deleteStation, deleteLine). Src and dest indexes cover every column.
+CREATE INDEX IF NOT EXISTS idx_departure_src ON Departure (id_src, src_datetime, id_dest, id_line, dest_datetime, is_we_holidays);
+CREATE INDEX IF NOT EXISTS idx_departure_dest ON Departure (id_dest, dest_datetime, id_src, id_line, src_datetime, is_we_holidays);
+CREATE INDEX IF NOT EXISTS idx_departure_line ON Departure (id_line, src_datetime);
+CREATE INDEX IF NOT EXISTS idx_departure_src_datetime ON Departure (src_datetime);
+CREATE INDEX IF NOT EXISTS idx_departure_dest_datetime ON Departure (dest_datetime);
+
+-- Stops of a line (/passs?line=, deleteLine), the primary key already starts with id_station
+CREATE INDEX IF NOT EXISTS idx_pass_line ON Pass (id_line, number);
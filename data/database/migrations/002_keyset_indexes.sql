@@ -0,0 +1,8 @@
+-- Keyset pages of /departures follow id_depature : with a filter, the index of the filtered column
+-- must give its rows in id order, otherwise SQLite sorts every match before the first page.
+CREATE INDEX IF NOT EXISTS idx_departure_src_id ON Departure (id_src, id_depature);
+CREATE INDEX IF NOT EXISTS idx_departure_dest_id ON Departure (id_dest, id_depature);
+CREATE INDEX IF NOT EXISTS idx_departure_line_id ON Departure (id_line, id_depature);
+
+-- Keyset pages of /passs follow (id_line, id_station)
+CREATE INDEX IF NOT EXISTS idx_pass_line_station ON Pass (id_line, id_station, number);
@@ -34,4 +34,7 @@ CREATE TABLE Departure (
   FOREIGN KEY (id_dest) REFERENCES Station(id_station) ON DELETE CASCADE
   FOREIGN KEY (id_line) REFERENCES Line(id_line) ON DELETE CASCADE
   CHECK (src_datetime < dest_datetime)
-);
\ No newline at end of file
+);
+
+-- Indexes are created by the migrations (DB.migrate), replayed from scratch after a reset
+PRAGMA user_version = 0;
\ No newline at end of file
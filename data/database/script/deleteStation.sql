@@ -5,11 +5,8 @@ DELETE FROM Pass WHERE id_station = (
     WHERE s.name = "?"
 );
 
-DELETE FROM Departure WHERE id_depature IN (
-    SELECT d.id_depature FROM Departure d
-    JOIN Station s1 ON s1.id_station = d.id_src
-    JOIN Station s2 ON s2.id_station = d.id_dest
-    WHERE s1.name = "?" OR s2.name = "?"
-);
+DELETE FROM Departure
+WHERE id_src IN (SELECT s1.id_station FROM Station s1 WHERE s1.name = "?")
+OR id_dest IN (SELECT s2.id_station FROM Station s2 WHERE s2.name = "?");
 
 DELETE FROM Station WHERE name = "?";
\ No newline at end of file
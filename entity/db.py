@@ -1,41 +1,123 @@
 import sqlite3
+import multiprocessing
 import os
-from datetime import datetime
+import threading
+import time
+from contextlib import contextmanager
+
+# Applied once to every new connection
+PRAGMAS = [
+    "PRAGMA journal_mode=WAL", # readers never block the writer
+    "PRAGMA synchronous=NORMAL", # safe with WAL, no fsync per commit
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000", # 16 MB page cache
+    "PRAGMA mmap_size=67108864",
+    "PRAGMA busy_timeout=5000"
+]
 
 class DB:
-    def __init__(self, folder="", database=None):
+    def __init__(self, folder="", database=None, cachedStatements=256):
         self.folder = folder
         self.file = database
+        self.cachedStatements = cachedStatements # prepared statements kept per connection
+        self.local = threading.local() # one connection per thread, reused across requests
+        self.onQuery = None # onQuery(statement, seconds) after each execute/iterate, for metrics
+
+    @property
+    def conn(self):
+        return self.connect()
 
     def reconnect(self):
         self.close()
         self.connect()
 
     def connect(self):
-        self.conn = sqlite3.connect(self.folder + self.file)
-        self.cursor = self.conn.cursor()
+        # Connection of the calling thread, opened and tuned only on its first use
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.folder + self.file, cached_statements=self.cachedStatements)
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            self.local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        # Commits on success, rolls back on any error
+        conn = self.connect()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
 
     def executeFile(self, sqlFile, args=()):
-        self.connect()
         with open(sqlFile, 'r') as sql:
             request = sql.read()
             for arg in args:
                 request = request.replace('?', arg, 1)
-            self.cursor.executescript(request)
-        self.conn.commit()
-        self.close()
+        conn = self.connect()
+        conn.executescript(request)
+        conn.commit()
+
+    def migrate(self, folder):
+        # Applies the "<number>_<name>.sql" scripts of `folder` newer than PRAGMA user_version,
+        # each one in its own transaction. Returns the names of the applied scripts
+        version = self.execute("PRAGMA user_version;", (), type="one")[0]
+        scripts = sorted((int(file.split("_")[0]), file) for file in os.listdir(folder) if file.endswith(".sql"))
+        applied = []
+        conn = self.connect()
+        for (number, file) in scripts:
+            if number <= version:
+                continue
+            with open(os.path.join(folder, file), 'r') as sql:
+                conn.executescript(f"BEGIN;\n{sql.read()}\nPRAGMA user_version = {number};\nCOMMIT;")
+            applied.append(file)
+        return applied
 
     def execute(self, query, args=(), type="all"):
-        self.cursor.execute(query, args)
+        start = time.perf_counter()
+        cursor = self.connect().execute(query, args)
         if type == "one":
-            return self.cursor.fetchone()
+            result = cursor.fetchone()
         else :
-            return self.cursor.fetchall()
-    
+            result = cursor.fetchall()
+        self.__observe(query, start)
+        return result
+
+    def statement(query):
+        # "SELECT Departure", "DELETE Station"... : short name of a query, the first table it reads or writes
+        words = query.split()
+        table = next((words[i + 1] for i in range(len(words) - 1) if words[i].upper() in ["FROM", "INTO", "UPDATE"]), "")
+        return f"{words[0].upper() if words else ''} {table}".strip()
+
+    def __observe(self, query, start):
+        if self.onQuery is not None:
+            self.onQuery(DB.statement(query), time.perf_counter() - start)
+
+    def iterate(self, query, args=(), size=256):
+        # Rows fetched lazily, `size` at a time : memory stays constant whatever the result size
+        start = time.perf_counter()
+        cursor = self.connect().execute(query, args)
+        try:
+            while True:
+                rows = cursor.fetchmany(size)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            cursor.close()
+            self.__observe(query, start) # the whole stream, consumer included
+
     def close(self):
-        self.conn.close()
+        # Only needed on shutdown : connections live as long as their thread
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
 
-    def __getData(self, filename):
+    def __getData(filename):
         try:
             with open(filename, 'r', encoding='utf-8') as f:
                 content = f.read()
@@ -71,90 +153,109 @@ class DB:
             }
         }
 
-    def insertTxtFolder(self):
-        self.connect()
-        DATASET_PATH = self.folder + "txt/"
-        DATA_FILES_NAMES = [f for f in os.listdir(DATASET_PATH) if os.path.isfile(os.path.join(DATASET_PATH, f))]
-
-        DATAS_RAW = {}
-        for file in DATA_FILES_NAMES:
-            lineNumber = file.split("_")[0]
-            DATAS_RAW[lineNumber] = self.__getData(f"{DATASET_PATH}{file}")
-
-        for (lineName, raw_lines) in DATAS_RAW.items():
-            self.__insertLine(lineName)
-            for (key, raw_line) in raw_lines.items():
-                self.__insertStations(raw_line)
-                self.__insertPass(raw_line, lineName)
-                self.__insertDeparture(raw_line, lineName, key == "we_holidays")
-        self.close()
-
-    def __formatStationName(name):
-        return name.replace("_", " ").replace("-", " ").lower()
+    def parseTxtFile(filename):
+        # One line file => rows keyed by names, ids are resolved later by insertTxtFolder
+        lineName = os.path.basename(filename).split("_")[0]
+        services = []
+        for (key, raw_line) in DB.__getData(filename).items():
+            numbers = {}
+            for (number, name) in enumerate(raw_line['path']):
+                numbers.setdefault(name, number) # first stop of the line with this name
+            services.append({
+                'path': [DB.__formatStationName(name) for name in raw_line['path']],
+                'passes': [(DB.__formatStationName(name), numbers[name]) for name in raw_line['path']],
+                'departures': DB.__getDepartures(raw_line, key == "we_holidays")
+            })
+        return { 'line': lineName, 'services': services }
 
-    def __insertLine(self, lineName):
+    def insertTxtFolder(self, processes=None):
+        # Bulk import : files parsed in parallel, station and line ids resolved once,
+        # every row written with executemany in a single transaction.
+        # Returns (rows inserted, seconds spent) : passes and departures already stored are ignored, not counted
+        REQUEST_INDEXES = """
+            SELECT name, sql FROM sqlite_master
+            WHERE type = 'index' AND tbl_name IN ('Departure', 'Pass') AND sql IS NOT NULL;
+        """
         REQUEST_LINE = "INSERT OR IGNORE INTO Line (name) VALUES (?);"
-        self.execute(REQUEST_LINE, (lineName,))
-        self.conn.commit()
-
-    def __insertStations(self, raw_line):
         REQUEST_STATION = "INSERT OR IGNORE INTO Station (name) VALUES (?);"
-        for name in raw_line['path']:
-            self.execute(REQUEST_STATION, (DB.__formatStationName(name),))
-        self.conn.commit()
-
-    def __insertPass(self, raw_line, lineName):
-        REQUEST_PASS = """
-            INSERT OR IGNORE INTO Pass (id_station, id_line, number)
-            VALUES (
-                (SELECT id_station FROM Station WHERE name LIKE ?),
-                (SELECT id_line FROM Line WHERE name LIKE ?),
-                ?
-            );
-        """
-        for name in raw_line['path']:
-            self.execute(REQUEST_PASS, (DB.__formatStationName(name), lineName, raw_line['path'].index(name)))
-        self.conn.commit()
-
-    def __insertDeparture(self, raw_line, lineName, isWeHoliday):
+        REQUEST_PASS = "INSERT OR IGNORE INTO Pass (id_station, id_line, number) VALUES (?, ?, ?);"
         REQUEST_DEPARTURE = """
             INSERT OR IGNORE INTO Departure (id_src, id_dest, id_line, src_datetime, dest_datetime, is_we_holidays)
-            VALUES (
-                (SELECT id_station FROM Station WHERE name LIKE ?),
-                (SELECT id_station FROM Station WHERE name LIKE ?),
-                (SELECT id_line FROM Line WHERE name LIKE ?),
-                ?, ?, ?
-            );
+            VALUES (?, ?, ?, ?, ?, ?);
         """
-        for direction in ["go", "back"]:
-            for (station, hours) in raw_line[direction].items():
-                path = [key for key in raw_line[direction].keys()]
-                stationIndex = path.index(station)
+        start = time.perf_counter()
+        DATASET_PATH = self.folder + "txt/"
+        DATA_FILES = [os.path.join(DATASET_PATH, f) for f in os.listdir(DATASET_PATH) if os.path.isfile(os.path.join(DATASET_PATH, f))]
+
+        processes = min(len(DATA_FILES), processes or os.cpu_count() or 1)
+        if processes > 1:
+            with multiprocessing.Pool(processes) as pool:
+                files = pool.map(DB.parseTxtFile, DATA_FILES)
+        else:
+            files = [DB.parseTxtFile(filename) for filename in DATA_FILES]
+
+        with self.transaction() as conn:
+            conn.execute("BEGIN") # the index drops below are part of the transaction too
+            indexes = conn.execute(REQUEST_INDEXES).fetchall()
+            for (name, sql) in indexes:
+                conn.execute(f'DROP INDEX "{name}";') # rebuilt once after the inserts
+
+            conn.executemany(REQUEST_LINE, [(file['line'],) for file in files])
+            conn.executemany(REQUEST_STATION, [(name,) for file in files for service in file['services'] for name in service['path']])
+            lines = dict(conn.execute("SELECT name, id_line FROM Line;"))
+            stations = dict(conn.execute("SELECT name, id_station FROM Station;"))
 
-                if (stationIndex == len(path)-1):
-                    continue # Stop is the last stop of the travel, so no edge to create
+            passes = []
+            departures = []
+            for file in files:
+                line = lines[file['line']]
+                for service in file['services']:
+                    passes.extend((stations[name], line, number) for (name, number) in service['passes'])
+                    departures.extend((stations[src], stations[dest], line, srcTime, destTime, isWeHoliday) for (src, dest, srcTime, destTime, isWeHoliday) in service['departures'])
+            changes = conn.total_changes
+            conn.executemany(REQUEST_PASS, passes)
+            conn.executemany(REQUEST_DEPARTURE, departures)
+            rows = conn.total_changes - changes
 
-                for t_hour in range(len(hours)):
-                    s_hour = hours[t_hour]
+            for (name, sql) in indexes:
+                conn.execute(sql)
+
+        return (rows, time.perf_counter() - start)
+
+    def __formatStationName(name):
+        return name.replace("_", " ").replace("-", " ").lower()
+
+    def __formatHour(hour):
+        # "H:MM" => same text sqlite3 stores for datetime.strptime(hour, '%H:%M')
+        (hours, minutes) = hour.split(":")
+        return f"1900-01-01 {int(hours):02d}:{int(minutes):02d}:00"
+
+    def __getDepartures(raw_line, isWeHoliday):
+        # (src name, dest name, src datetime, dest datetime, is_we_holidays) for each bus between two stops
+        departures = []
+        for direction in ["go", "back"]:
+            path = list(raw_line[direction].keys())
+            hours = [raw_line[direction][station] for station in path]
+            for stationIndex in range(len(path) - 1): # no edge from the last stop of the travel
+                for t_hour in range(len(hours[stationIndex])):
+                    s_hour = hours[stationIndex][t_hour]
                     if (s_hour == '-'):
                         continue # No bus at this hour
 
-                    nextStation = None
+                    nextIndex = None
                     for _id_st in range(stationIndex+1, len(path)):
-                        _station = path[_id_st]
-                        e_hour = raw_line[direction][_station][t_hour]
-                        if e_hour == '-':
-                            continue
-                        nextStation = _station
-                        break
-
-                    if (nextStation == None):
+                        if hours[_id_st][t_hour] != '-':
+                            nextIndex = _id_st
+                            break
+
+                    if (nextIndex == None):
                         continue
 
-                    #print(f"Ligne {lineName} : {station} ({s_hour}) -> {nextStation} ({e_hour}) [{isWeHoliday}]")
-                    src = datetime.strptime(s_hour, '%H:%M')
-                    dest = datetime.strptime(e_hour, '%H:%M')
-                    formatted_station_s = DB.__formatStationName(station)
-                    formatted_station_e = DB.__formatStationName(nextStation)
-                    self.execute(REQUEST_DEPARTURE, (formatted_station_s, formatted_station_e, lineName, src, dest, isWeHoliday,))
-        self.conn.commit()
\ No newline at end of file
+                    departures.append((
+                        DB.__formatStationName(path[stationIndex]),
+                        DB.__formatStationName(path[nextIndex]),
+                        DB.__formatHour(s_hour),
+                        DB.__formatHour(hours[nextIndex][t_hour]),
+                        isWeHoliday
+                    ))
+        return departures
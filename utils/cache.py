@@ -0,0 +1,57 @@
+from collections import OrderedDict
+import threading
+
+class RouteCache:
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.versions = {} # services bitmask => graph version of the cached entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    def __sync(self, services, version):
+        # One graph serves every mask : the first access with a newer version invalidates the entries
+        # of that services mask, the other masks are invalidated on their own next access
+        current = self.versions.get(services)
+        if current is None or version > current:
+            stale = [key for key in self.entries if key[0] == services]
+            for key in stale:
+                del self.entries[key]
+            self.invalidations += len(stale)
+            self.versions[services] = version
+        return self.versions[services] == version
+
+    def get(self, key, version):
+        # key => (services bitmask, algorithm, ...)
+        with self.lock:
+            if self.__sync(key[0], version) and key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, version, value):
+        with self.lock:
+            if not self.__sync(key[0], version):
+                return # computed on an outdated graph
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                "size" : len(self.entries),
+                "maxsize" : self.maxsize,
+                "hits" : self.hits,
+                "misses" : self.misses,
+                "evictions" : self.evictions,
+                "invalidations" : self.invalidations,
+                "versions" : dict(self.versions)
+            }
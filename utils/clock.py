@@ -0,0 +1,9 @@
+def toMinutes(value):
+    # datetime / time or "HH:MM" => minutes since midnight
+    if isinstance(value, str):
+        (hours, minutes) = value.split(":")[:2]
+        return int(hours) * 60 + int(minutes)
+    return value.hour * 60 + value.minute
+
+def formatMinutes(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
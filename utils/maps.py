@@ -0,0 +1,65 @@
+import atexit
+import threading
+from utils.services import ALL
+
+class MapRenderer:
+    # Renders the network maps in a background thread, one PNG per map name and graph version
+    def __init__(self):
+        self.images = {} # map name => (version, png bytes)
+        self.layouts = {} # map name => (topology, layout), reused while stations and links are unchanged
+        self.pending = {} # map name => (newest graph waiting to be rendered, services drawn)
+        self.renders = 0
+        self.condition = threading.Condition()
+        self.stopping = threading.Event()
+        self.worker = threading.Thread(target=self.__run, name="map-renderer", daemon=True)
+        self.worker.start()
+        atexit.register(self.stop) # a daemon thread killed in the middle of a draw aborts the interpreter
+
+    def submit(self, graphType, graph, services=ALL):
+        # Queue a render unless this version (or a newer one) is already rendered or queued
+        with self.condition:
+            rendered = self.images[graphType][0] if graphType in self.images else -1
+            queued = self.pending[graphType][0].version if graphType in self.pending else -1
+            if max(rendered, queued) >= graph.version:
+                return
+            self.pending[graphType] = (graph, services)
+            self.condition.notify_all()
+
+    def get(self, graphType, version=None, timeout=None):
+        # (version, png) : waits for `version` when given, otherwise for any rendered version
+        with self.condition:
+            ready = lambda: graphType in self.images and (version is None or self.images[graphType][0] >= version)
+            self.condition.wait_for(ready, timeout)
+            return self.images.get(graphType)
+
+    def stop(self, timeout=10):
+        # The render in progress is finished, the pending ones are dropped
+        with self.condition:
+            self.stopping.set()
+            self.condition.notify_all()
+        self.worker.join(timeout)
+
+    def __run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: len(self.pending) > 0 or self.stopping.is_set())
+                if self.stopping.is_set():
+                    return
+                (graphType, (graph, services)) = self.pending.popitem()
+
+            try:
+                topology = graph.topology(services)
+                (known, layout) = self.layouts.get(graphType, (None, None))
+                if known != topology:
+                    layout = graph.layout(services)
+                    self.layouts[graphType] = (topology, layout)
+                image = graph.render(layout, services)
+            except Exception as e:
+                print(f"Fails to render the {graphType} map : {e}")
+                continue
+
+            with self.condition:
+                if graphType not in self.images or self.images[graphType][0] < graph.version:
+                    self.images[graphType] = (graph.version, image)
+                    self.renders += 1
+                self.condition.notify_all()
@@ -0,0 +1,82 @@
+from contextlib import contextmanager
+import threading
+import time
+
+# Latency buckets in seconds, from half a millisecond to ten seconds
+BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+# Search effort buckets (settled nodes, relaxed edges)
+COUNTS = [1, 10, 100, 1000, 10000, 100000, 1000000]
+
+class Metrics:
+    # Counters, gauges and histograms, rendered in the Prometheus text format
+    def __init__(self):
+        self.help = {} # name => description
+        self.types = {} # name => counter, gauge or histogram
+        self.values = {} # name => { labels : value, or [bucket counts..., sum, count] for histograms }
+        self.buckets = {} # histogram name => upper bounds
+        self.lock = threading.Lock()
+
+    def describe(self, name, type, help, buckets=BUCKETS):
+        with self.lock:
+            self.help[name] = help
+            self.types[name] = type
+            self.values.setdefault(name, {})
+            if type == "histogram":
+                self.buckets[name] = buckets
+
+    def inc(self, name, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            values = self.values.setdefault(name, {})
+            values[key] = values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.values.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            buckets = self.buckets.setdefault(name, BUCKETS)
+            values = self.values.setdefault(name, {})
+            if key not in values:
+                values[key] = [0] * (len(buckets) + 2)
+            histogram = values[key]
+            for (i, bound) in enumerate(buckets):
+                if value <= bound:
+                    histogram[i] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for (name, values) in self.values.items():
+                type = self.types.get(name, "histogram" if name in self.buckets else "gauge")
+                if name in self.help:
+                    lines.append(f"# HELP {name} {self.help[name]}")
+                lines.append(f"# TYPE {name} {type}")
+                for (key, value) in values.items():
+                    if type != "histogram":
+                        lines.append(f"{name}{Metrics.__labels(key)} {value}")
+                        continue
+                    for (i, bound) in enumerate(self.buckets[name]):
+                        lines.append(f"{name}_bucket{Metrics.__labels(key + (('le', bound),))} {value[i]}")
+                    lines.append(f"{name}_bucket{Metrics.__labels(key + (('le', '+Inf'),))} {value[-1]}")
+                    lines.append(f"{name}_sum{Metrics.__labels(key)} {value[-2]}")
+                    lines.append(f"{name}_count{Metrics.__labels(key)} {value[-1]}")
+        return "\n".join(lines) + "\n"
+
+    def __labels(key):
+        if len(key) == 0:
+            return ""
+        escape = lambda value: str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        return "{" + ",".join(f'{label}="{escape(value)}"' for (label, value) in key) + "}"
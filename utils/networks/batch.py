@@ -0,0 +1,78 @@
+import atexit
+import multiprocessing
+import os
+import signal
+import threading
+from entity.db import DB
+
+GRAPH = None # graph of the worker process, set once when the worker starts
+DATABASE = None # server workers only : reloads GRAPH when the queries come from another graph version
+
+def init(graph, database=None):
+    global GRAPH, DATABASE
+    GRAPH = graph
+    if database is not None:
+        DATABASE = DB(*database) # own connection, never the one of the parent
+        signal.signal(signal.SIGINT, signal.SIG_IGN) # Ctrl-C stops the server, which terminates its pool
+
+def route(query):
+    # query => (services, algorithm, engine, src, dest, datetime)
+    (services, algorithm, engine, src, dest, datetime) = query
+    return GRAPH.route(algorithm, engine, src, dest, datetime, services)
+
+def routeVersion(task):
+    # task => (graph version, query), the graph is loaded again from the database after a write
+    global GRAPH
+    from utils.networks.loader import loadGraph # the loader imports graph.py, which imports this module
+    (version, query) = task
+    if GRAPH is None or GRAPH.version != version:
+        (GRAPH, timings) = loadGraph(DATABASE)
+        GRAPH.version = version
+    return route(query)
+
+def workers(processes=None):
+    # Clamped to 1..cpu_count
+    count = os.cpu_count() or 1
+    return max(1, min(int(processes or count), count))
+
+def context():
+    # fork shares the parent pages copy-on-write, spawn where fork is not available
+    return multiprocessing.get_context("fork" if os.name == "posix" else "spawn")
+
+def run(graph, queries, processes=None):
+    # Fan the queries out over a process pool, results are yielded in input order.
+    # The graph is handed to each worker once (inherited on fork), never pickled per task.
+    queries = list(queries)
+    processes = workers(processes)
+    chunksize = max(1, len(queries) // (processes * 4))
+    with context().Pool(processes, initializer=init, initargs=(graph,)) as pool:
+        yield from pool.imap(route, queries, chunksize)
+
+class BatchPool:
+    # Pool of the server, started by the first batch. Its workers come from a fork server (spawn where there
+    # is none) : forking the threaded server itself could copy a lock held by another thread.
+    # Each worker loads the graph from the database, and again after every write (one full load per worker
+    # and graph version, paid by the next batch)
+    def __init__(self, database, processes=None):
+        self.database = database
+        self.processes = workers(processes)
+        self.pool = None
+        self.lock = threading.Lock()
+        atexit.register(self.close)
+
+    def __start(self):
+        with self.lock:
+            if self.pool is None:
+                method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                self.pool = multiprocessing.get_context(method).Pool(self.processes, initializer=init, initargs=(None, self.database))
+            return self.pool
+
+    def run(self, graph, queries):
+        # Same as run(), on the workers of the pool
+        queries = list(queries)
+        chunksize = max(1, len(queries) // (self.processes * 4))
+        yield from self.__start().imap(routeVersion, [(graph.version, query) for query in queries], chunksize)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
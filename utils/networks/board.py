@@ -0,0 +1,48 @@
+import bisect
+import heapq
+from utils.services import BITS
+
+class DepartureBoard:
+    def __init__(self, outEdges={}, passes={}):
+        # (station, service bit) => { (line, terminus) : (departures sorted by time, their times) }
+        # the terminus is the last station of the line in the direction of travel (order of the stations in Pass)
+        termini = {}
+        for (line, numbers) in passes.items():
+            if len(numbers) > 0:
+                termini[(line, True)] = max(numbers, key=numbers.get)
+                termini[(line, False)] = min(numbers, key=numbers.get)
+
+        self.groups = {}
+        for (node, edges) in outEdges.items(): # already sorted by departure
+            for edge in edges:
+                line = edge.weight[3]
+                numbers = passes.get(line, {})
+                terminus = None
+                if edge.src.data.name in numbers and edge.dest.data.name in numbers:
+                    terminus = termini[(line, numbers[edge.dest.data.name] > numbers[edge.src.data.name])]
+                for bit in BITS.values():
+                    if edge.weight[4] & bit:
+                        (departures, times) = self.groups.setdefault((node, bit), {}).setdefault((line, terminus), ([], []))
+                        departures.append(edge)
+                        times.append(edge.weight[0])
+
+    def next(self, station, time, services, count=5):
+        # [(line, terminus, the next `count` departures at or after `time`)], for the services running that day
+        found = {}
+        for bit in BITS.values():
+            if not bit & services:
+                continue
+            for (group, (departures, times)) in self.groups.get((station, bit), {}).items():
+                index = bisect.bisect_left(times, time)
+                found.setdefault(group, []).append(departures[index:index + count])
+
+        board = []
+        for ((line, terminus), slices) in found.items():
+            departures = slices[0]
+            if len(slices) > 1:
+                # A departure running on several of the services is listed once
+                merged = heapq.merge(*slices, key=lambda edge: edge.weight[0])
+                departures = list({id(edge): edge for edge in merged}.values())[:count]
+            if len(departures) > 0:
+                board.append((line, terminus, departures))
+        return sorted(board, key=lambda group: (group[2][0].weight[0], group[0]))
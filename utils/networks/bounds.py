@@ -0,0 +1,41 @@
+import heapq
+
+class RideTimes:
+    def __init__(self, edges=[]):
+        # Shortest ride (waiting excluded) between two directly linked stations, in both directions
+        self.forward = {} # name => { next station name : minutes }
+        self.backward = {} # name => { previous station name : minutes }
+        for edge in edges:
+            (u, v) = (edge.src.data.name, edge.dest.data.name)
+            ride = edge.weight[1] - edge.weight[0]
+            if v not in self.forward.setdefault(u, {}) or ride < self.forward[u][v]:
+                self.forward[u][v] = ride
+                self.backward.setdefault(v, {})[u] = ride
+        self.towards = {} # dest name => lower bounds, computed once per dest
+        self.awayFroms = {} # src name => lower bounds, computed once per src
+
+    def toward(self, dest):
+        # Station name => minimum riding time to reach dest from it, missing when dest is out of reach
+        if dest.data.name not in self.towards:
+            self.towards[dest.data.name] = RideTimes.__search(self.backward, dest.data.name)
+        return self.towards[dest.data.name]
+
+    def awayFrom(self, src):
+        # Station name => minimum riding time to reach it from src
+        if src.data.name not in self.awayFroms:
+            self.awayFroms[src.data.name] = RideTimes.__search(self.forward, src.data.name)
+        return self.awayFroms[src.data.name]
+
+    def __search(adjacency, start):
+        # Static Dijkstra over the minimum rides
+        bounds = {}
+        heap = [(0, start)]
+        while len(heap) > 0:
+            (minutes, name) = heapq.heappop(heap)
+            if name in bounds:
+                continue
+            bounds[name] = minutes
+            for (next, ride) in adjacency.get(name, {}).items():
+                if next not in bounds:
+                    heapq.heappush(heap, (minutes + ride, next))
+        return bounds
@@ -0,0 +1,113 @@
+import bisect
+from utils.networks.edge import Edge
+from utils.services import ALL
+
+class CSA:
+    def __init__(self, edges=[]):
+        # Connections sorted once : by departure time for forward scans, by arrival time for backward scans
+        self.connections = sorted(edges, key=lambda edge: edge.weight[0])
+        self.departures = [edge.weight[0] for edge in self.connections]
+        self.connectionsByArrival = sorted(edges, key=lambda edge: edge.weight[1])
+        self.arrivals = [edge.weight[1] for edge in self.connectionsByArrival]
+
+    def fastest(self, src, dest, datetime, services=ALL):
+        # Earliest arrival : one scan over the connections departing after `datetime`
+        arrivals = {src: datetime}
+        parents = {src: None}
+        for i in range(bisect.bisect_left(self.departures, datetime), len(self.connections)):
+            edge = self.connections[i]
+            if dest in arrivals and edge.weight[0] >= arrivals[dest]:
+                break # no later connection can improve the arrival at dest
+            if edge.src not in arrivals or arrivals[edge.src] > edge.weight[0] or not edge.weight[4] & services:
+                continue # src not reached yet, or not running
+            if edge.dest not in arrivals or edge.weight[1] < arrivals[edge.dest]:
+                arrivals[edge.dest] = edge.weight[1]
+                parents[edge.dest] = edge
+
+        if dest not in parents:
+            return None
+        path = []
+        node = dest
+        while parents[node] is not None:
+            path.append(parents[node])
+            node = parents[node].src
+        return path[::-1]
+
+    def foremost(self, src, dest, datetime, services=ALL):
+        # Latest departure : one backward scan over the connections arriving before `datetime`
+        departures = {dest: datetime}
+        parents = {dest: None}
+        for i in range(bisect.bisect_right(self.arrivals, datetime) - 1, -1, -1):
+            edge = self.connectionsByArrival[i]
+            if src in departures and edge.weight[1] <= departures[src]:
+                break # no earlier connection can improve the departure from src
+            if edge.dest not in departures or departures[edge.dest] < edge.weight[1] or not edge.weight[4] & services:
+                continue # dest not reached yet, or not running
+            if edge.src not in departures or edge.weight[0] > departures[edge.src]:
+                departures[edge.src] = edge.weight[0]
+                parents[edge.src] = edge
+
+        if src not in parents:
+            return None
+        path = []
+        node = src
+        while parents[node] is not None:
+            path.append(parents[node])
+            node = parents[node].dest
+
+        # Same shape as Graph.foremost : reversed edges, from dest back to src
+        edges = []
+        current_time = datetime
+        for edge in path[::-1]:
+            cost = abs(current_time - edge.weight[0]) # waiting + trajet
+            edges.append(Edge(edge.dest, edge.src, [edge.weight[1], edge.weight[0], cost, edge.weight[3]]))
+            current_time = edge.weight[0]
+        return edges
+
+    def profile(self, src, dest, start, end, services=ALL):
+        # Every non-dominated (departure, arrival) journey leaving src between start and end :
+        # one backward scan, keeping per station the Pareto profile of (departure, arrival, edge, next).
+        # src's profile is built from all its departures : one leaving after `end` can still dominate those inside
+        profiles = {}
+        for i in range(len(self.connections) - 1, bisect.bisect_left(self.departures, start) - 1, -1):
+            edge = self.connections[i]
+            if edge.src == dest or not edge.weight[4] & services:
+                continue
+
+            if edge.dest == dest:
+                entry = (edge.weight[0], edge.weight[1], edge, None)
+            else:
+                next = CSA.__firstAfter(profiles.get(edge.dest, []), edge.weight[1])
+                if next is None:
+                    continue # dest not reachable after this connection
+                entry = (edge.weight[0], next[1], edge, next)
+
+            profile = profiles.setdefault(edge.src, [])
+            if len(profile) > 0 and entry[1] >= profile[-1][1]:
+                continue # dominated by a later departure
+            if len(profile) > 0 and entry[0] == profile[-1][0]:
+                profile.pop()
+            profile.append(entry)
+
+        journeys = []
+        for entry in reversed(profiles.get(src, [])):
+            if entry[0] > end:
+                break # sorted by departure from here
+            path = []
+            next = entry
+            while next is not None:
+                path.append(next[2])
+                next = next[3]
+            journeys.append({ "departure": entry[0], "arrival": entry[1], "journey": path })
+        return journeys
+
+    def __firstAfter(profile, time):
+        # Profiles are sorted by decreasing departure : last entry leaving at or after `time`
+        (low, high) = (0, len(profile))
+        while low < high:
+            middle = (low + high) // 2
+            if profile[middle][0] >= time:
+                low = middle + 1
+            else:
+                high = middle
+        return profile[low - 1] if low > 0 else None
@@ -1,4 +1,5 @@
 from utils.networks.node import Node
+from utils.clock import formatMinutes
 
 class Edge:
     def __init__(self, src:Node, dest:Node, weight=1):
@@ -16,8 +17,8 @@ class Edge:
             "src": self.src.to_dict(),
             "dest": self.dest.to_dict(),
             "other": {
-                "start": self.weight[0].strftime('%H:%M'),
-                "end": self.weight[1].strftime('%H:%M'),
+                "start": formatMinutes(self.weight[0]),
+                "end": formatMinutes(self.weight[1]),
                 "line": self.weight[3]
             }
         }
\ No newline at end of file
@@ -1,15 +1,205 @@
 import networkx as nx
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from datetime import datetime, timedelta
 from utils.networks.node import Node
 from utils.networks.edge import Edge
+from utils.networks.csa import CSA
+from utils.networks.raptor import Raptor
+from utils.networks.timetable import Timetable
+from utils.networks.hops import HopMatrix, FAR
+from utils.networks.bounds import RideTimes
+from utils.networks.board import DepartureBoard
+from utils.networks import batch
+from utils.services import ALL
+import io
 import os
+import bisect
+import heapq
+import itertools
+import threading
+from time import perf_counter
 from matplotlib.lines import Line2D
 
 class Graph:
-    def __init__(self, nodes=[], edges=[]):
-        self.nodes = nodes
-        self.edges = edges
+    def __init__(self, nodes=None, edges=None, passes=None):
+        # Changed in place by the add/remove methods : never a shared default
+        self.nodes = nodes if nodes is not None else []
+        self.edges = edges if edges is not None else []
+        self.passes = passes if passes is not None else {} # line => { station name => index in the line }
+        self.version = 0
+        (self.__hops, self.__staleHops, self.__hopsLock) = (None, None, threading.Lock())
+        self.buildIndex()
+
+    def buildIndex(self):
+        # Adjacency index : out-edges sorted by departure time, in-edges sorted by arrival time
+        self.outEdges = {node: [] for node in self.nodes}
+        self.inEdges = {node: [] for node in self.nodes}
+        for edge in sorted(self.edges, key=lambda edge: edge.weight[0]):
+            self.outEdges.setdefault(edge.src, []).append(edge)
+        for edge in sorted(self.edges, key=lambda edge: edge.weight[1]):
+            self.inEdges.setdefault(edge.dest, []).append(edge)
+        self.outTimes = {node: [edge.weight[0] for edge in edges] for (node, edges) in self.outEdges.items()}
+        self.inTimes = {node: [edge.weight[1] for edge in edges] for (node, edges) in self.inEdges.items()}
+        self.__dropEngines()
+
+    def __dropEngines(self):
+        # Routing engines are built on first use and dropped whenever the timetable changes
+        self.__csa = None
+        self.__raptor = None
+        self.__timetable = None
+        self.__staleHops = self.__hops or self.__staleHops # (topology, matrix) kept to be reused while the links are unchanged
+        self.__hops = None
+        self.__rides = None
+        self.__board = None
+
+    @property
+    def csa(self):
+        if self.__csa is None:
+            self.__csa = CSA(self.edges)
+        return self.__csa
+    @property
+    def raptor(self):
+        if self.__raptor is None:
+            self.__raptor = Raptor(self.edges, self.passes)
+        return self.__raptor
+    @property
+    def timetable(self):
+        if self.__timetable is None:
+            self.__timetable = Timetable(self.edges, self.version)
+        return self.__timetable
+    @property
+    def hops(self):
+        # All-pairs matrix, the costliest engine : built once per version under a lock, and not at all
+        # when the previous version had the same links (a write that only changes times or services)
+        if self.__hops is None:
+            with self.__hopsLock:
+                if self.__hops is None:
+                    topology = self.topology()
+                    (known, hops) = self.__staleHops or (None, None)
+                    self.__hops = (topology, hops if known == topology else HopMatrix(self.edges))
+                    self.__staleHops = None
+        return self.__hops[1]
+    @property
+    def rides(self):
+        if self.__rides is None:
+            self.__rides = RideTimes(self.edges)
+        return self.__rides
+    @property
+    def board(self):
+        if self.__board is None:
+            self.__board = DepartureBoard(self.outEdges, self.passes)
+        return self.__board
+
+    def copy(self):
+        # Next version of the graph : nodes and edges are shared, modified buckets are replaced, never mutated
+        graph = Graph.__new__(Graph)
+        graph.nodes = list(self.nodes)
+        graph.edges = list(self.edges)
+        graph.passes = {line: dict(numbers) for (line, numbers) in self.passes.items()}
+        graph.version = self.version + 1
+        graph.outEdges = dict(self.outEdges)
+        graph.inEdges = dict(self.inEdges)
+        graph.outTimes = dict(self.outTimes)
+        graph.inTimes = dict(self.inTimes)
+        (graph.__hops, graph.__staleHops, graph.__hopsLock) = (self.__hops, self.__staleHops, threading.Lock())
+        graph.__dropEngines()
+        return graph
+
+    def addNode(self, node):
+        if node in self.outEdges:
+            return
+        self.nodes.append(node)
+        (self.outEdges[node], self.outTimes[node]) = ([], [])
+        (self.inEdges[node], self.inTimes[node]) = ([], [])
+
+    def removeNode(self, node):
+        if node not in self.outEdges:
+            return
+        self.removeEdges(self.outEdges[node] + self.inEdges[node])
+        self.nodes.remove(node)
+        for buckets in [self.outEdges, self.outTimes, self.inEdges, self.inTimes]:
+            del buckets[node]
+        for numbers in self.passes.values():
+            numbers.pop(node.data.name, None)
+
+    def renameNode(self, node, data):
+        if node not in self.outEdges:
+            return
+        renamed = Node(data)
+        edges = self.outEdges[node] + [edge for edge in self.inEdges[node] if edge.src != node]
+        numbers = {line: numbers[node.data.name] for (line, numbers) in self.passes.items() if node.data.name in numbers}
+        self.removeNode(node)
+        self.addNode(renamed)
+        self.addEdges([
+            Edge(renamed if edge.src == node else edge.src, renamed if edge.dest == node else edge.dest, list(edge.weight))
+            for edge in edges
+        ])
+        for (line, number) in numbers.items():
+            self.passes[line][renamed.data.name] = number
+
+    def addEdges(self, edges):
+        for edge in edges:
+            self.addNode(edge.src)
+            self.addNode(edge.dest)
+            self.edges.append(edge)
+            Graph.__insert(self.outEdges, self.outTimes, edge.src, edge, edge.weight[0])
+            Graph.__insert(self.inEdges, self.inTimes, edge.dest, edge, edge.weight[1])
+        self.__dropEngines()
+
+    def removeEdges(self, edges):
+        removed = set(id(edge) for edge in edges)
+        if len(removed) == 0:
+            return
+        self.edges = [edge for edge in self.edges if id(edge) not in removed]
+        for node in set(edge.src for edge in edges):
+            self.outEdges[node] = [edge for edge in self.outEdges[node] if id(edge) not in removed]
+            self.outTimes[node] = [edge.weight[0] for edge in self.outEdges[node]]
+        for node in set(edge.dest for edge in edges):
+            self.inEdges[node] = [edge for edge in self.inEdges[node] if id(edge) not in removed]
+            self.inTimes[node] = [edge.weight[1] for edge in self.inEdges[node]]
+        self.__dropEngines()
+
+    def renameLine(self, name, updatedName):
+        edges = [edge for edge in self.edges if edge.weight[3] == name]
+        self.removeEdges(edges)
+        self.addEdges([Edge(edge.src, edge.dest, edge.weight[:3] + [updatedName] + edge.weight[4:]) for edge in edges])
+        if name in self.passes:
+            self.passes[updatedName] = self.passes.pop(name)
+
+    def removeLine(self, name):
+        self.removeEdges([edge for edge in self.edges if edge.weight[3] == name])
+        self.passes.pop(name, None)
+
+    def addServices(self, src, dest, weight, services):
+        # Runs the departure weight => [start, end, cost, line] on `services` too, the edge is replaced, never mutated
+        edge = self.findEdge(src, dest, weight)
+        if edge is not None:
+            self.removeEdges([edge])
+            services |= edge.weight[4]
+        self.addEdges([Edge(src, dest, weight[:4] + [services])])
+
+    def removeServices(self, src, dest, weight, services):
+        # The edge is dropped once it runs on no service
+        edge = self.findEdge(src, dest, weight)
+        if edge is None:
+            return
+        self.removeEdges([edge])
+        if edge.weight[4] & ~services:
+            self.addEdges([Edge(edge.src, edge.dest, edge.weight[:4] + [edge.weight[4] & ~services])])
+
+    def __count(stats, settled, relaxed, filtering=0, relaxation=0):
+        if stats is not None:
+            stats["settled"] = stats.get("settled", 0) + settled
+            stats["relaxed"] = stats.get("relaxed", 0) + relaxed
+            stats["filter_seconds"] = stats.get("filter_seconds", 0) + filtering
+            stats["relax_seconds"] = stats.get("relax_seconds", 0) + relaxation
+
+    def __insert(buckets, times, node, edge, time):
+        # Copy of the bucket with the edge inserted at its place, the shared bucket is left untouched
+        index = bisect.bisect_right(times[node], time)
+        buckets[node] = buckets[node][:index] + [edge] + buckets[node][index:]
+        times[node] = times[node][:index] + [time] + times[node][index:]
 
     def getNodes(self):
         return self.nodes
@@ -26,6 +216,25 @@ class Graph:
             if edge.src == src and edge.dest == dest:
                 return edge
         return None
+    def findEdge(self, src, dest, weight):
+        # Edge of the departure weight => [start, end, cost, line], whatever its services
+        for edge in self.getOutEdges(src, weight[0]):
+            if edge.weight[0] != weight[0]:
+                break
+            if edge.dest == dest and edge.weight[1] == weight[1] and edge.weight[3] == weight[3]:
+                return edge
+        return None
+    
+    def getOutEdges(self, node, time):
+        # Edges leaving `node` that can still be boarded at `time`
+        if node not in self.outEdges:
+            return []
+        return self.outEdges[node][bisect.bisect_left(self.outTimes[node], time):]
+    def getInEdges(self, node, time):
+        # Edges reaching `node` no later than `time`
+        if node not in self.inEdges:
+            return []
+        return self.inEdges[node][:bisect.bisect_right(self.inTimes[node], time)]
     
     def errorDataEdges(self):
         for edge in self.edges:
@@ -60,10 +269,28 @@ class Graph:
         # Retourner la couleur en hexadécimal
         return f"#{r:02X}{g:02X}{b:02X}"
 
-    def show(self):
+    def __during(self, services):
+        # Edges running on at least one of `services`
+        return [edge for edge in self.edges if edge.weight[4] & services]
+
+    def topology(self, services=ALL):
+        # Stations and links drawn on the map, the layout only changes with them
+        return (frozenset(node.data.name for node in self.nodes), frozenset((edge.src.data.name, edge.dest.data.name) for edge in self.__during(services)))
+
+    def layout(self, services=ALL):
+        # Station name => (x, y), seeded so that the same topology always gives the same map
+        G = nx.Graph()
+        G.add_nodes_from(node.data.name for node in self.nodes)
+        G.add_edges_from((edge.src.data.name, edge.dest.data.name) for edge in self.__during(services))
+        return nx.spring_layout(G, k=1.5, iterations=200, seed=0)  # Ajuste `k` et `iterations` pour améliorer l'espacement
+
+    def render(self, layout=None, services=ALL):
+        # PNG bytes of the map, drawn on its own Figure (no pyplot global state) so it is safe off the main thread
+        layout = layout or self.layout(services)
+        edges = self.__during(services)
         G = nx.Graph()
 
-        lines = [edge.weight[3] for edge in self.edges]
+        lines = [edge.weight[3] for edge in edges]
         colors = {}
         for line in lines:
             if line in colors:
@@ -72,16 +299,19 @@ class Graph:
             colors[line] = self.__triangleColor(i)
 
         G.add_nodes_from(self.nodes)
-        for edge in self.edges:
+        for edge in edges:
             G.add_edge(edge.src, edge.dest, color=colors[edge.weight[3]])
 
         # Configuration style graph
-        pos = nx.spring_layout(G, k=1.5, iterations=200)  # Ajuste `k` et `iterations` pour améliorer l'espacement
+        pos = {node: layout[node.data.name] for node in G.nodes}
         edge_colors = nx.get_edge_attributes(G, 'color').values()
-        plt.figure(figsize=(12, 12))
+        figure = Figure(figsize=(12, 12))
+        FigureCanvasAgg(figure)
+        ax = figure.add_subplot()
         nx.draw(
             G,
             pos=pos,
+            ax=ax,
             edge_color=edge_colors,  # Appliquer les couleurs d'arêtes
             with_labels=True,  # Afficher les labels des nœuds
             node_size=700,  # Taille des nœuds
@@ -94,95 +324,191 @@ class Graph:
         legend_elements = [Line2D([0],[0], color=colors[line], lw=2, label=line) for line in colors.keys()]
         legend_elements += [ Line2D([0], [0], marker='o', color='lightblue', markersize=10, label='Arrêt de bus', linestyle='None', markeredgecolor='black')]
 
-        plt.legend(handles=legend_elements, loc='upper right', fontsize=12, title="Légende", title_fontsize=14)
-        plt.title("Graphique du système de bus", fontsize=16)
+        ax.legend(handles=legend_elements, loc='upper right', fontsize=12, title="Légende", title_fontsize=14)
+        ax.set_title("Graphique du système de bus", fontsize=16)
 
-        # Create empty file if not exists
-        if not os.path.exists("static/assets/map.png"):
-            os.makedirs("static/assets", exist_ok=True)
-            with open("map.png", "w") as f:
-                pass
+        image = io.BytesIO()
+        figure.savefig(image, format="png")
+        return image.getvalue()
 
+    def show(self, path="static/assets/map.png"):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
         try:
-            plt.savefig("static/assets/map.png")
-        except:
+            with open(path, "wb") as f:
+                f.write(self.render())
+        except OSError:
             print("Fails to save map")
 
-    def shortest(self, src, dest, datetime):
-        def lambda_process_edge(distances, current_node, datetime):
-            current_time = datetime if len(distances[current_node]) == 0 else distances[current_node][-1].weight[1]
-            edges = list(filter(lambda edge: edge.weight[0] >= current_time, self.edges)) # remove edges that are not available
-            edges_of_node_src = list(filter(lambda edge: edge.src == current_node, edges))
-
-            for edge in edges_of_node_src:
-                edge.weight[2] = 1
+    # The lambda_process_edge closures return (edge, cost) pairs : the shared edges are never written,
+    # every per-query value lives in the search itself so concurrent queries can share the graph
+    # astar : goal-directed search, the lower bounds (hops or riding times) also prune the stations
+    # that can't reach the target. stats : optional dict, receives the settled nodes and relaxed edges.
+    # services : bitmask of the running services, the other edges are skipped (the bounds hold for any subset)
+    def shortest(self, src, dest, datetime, astar=False, stats=None, services=ALL):
+        # The static hop count is a lower bound : a journey reaching it along the static shortest paths
+        # is optimal, otherwise the full search decides
+        hops = self.hops.distance(src, dest)
+        if hops is None:
+            return None # not connected, whatever the time
+        if hops < FAR: # otherwise deeper than the matrix counts : the full search decides
+            path = self.__alongShortestPaths(src, dest, datetime, hops, stats, services)
+            if path is not None:
+                return path
 
-            return edges_of_node_src 
+        def lambda_process_edge(current_node, current_time):
+            edges_of_node_src = self.getOutEdges(current_node, current_time) # only edges that are still available
+            return [(edge, 1) for edge in edges_of_node_src if edge.weight[4] & services]
         
-        return self.djikstra(src, dest, datetime, lambda_process_edge)
-    
-    def fastest(self, src, dest, datetime):
-        def lambda_process_edge(distances, current_node, datetime):
-            current_time = datetime if len(distances[current_node]) == 0 else distances[current_node][-1].weight[1]
-            edges = list(filter(lambda edge: edge.weight[0] >= current_time, self.edges)) # remove edges that are not available
-            edges_of_node_src = list(filter(lambda edge: edge.src == current_node, edges))
+        heuristic = (lambda node: self.hops.distance(node, dest)) if astar else None
+        return self.djikstra(src, dest, datetime, lambda_process_edge, heuristic, stats)
 
-            for edge in edges_of_node_src:
-                edge.weight[2] = (edge.weight[1] - current_time).total_seconds() # waiting + trajet
+    def __alongShortestPaths(self, src, dest, datetime, hops, stats=None, services=ALL):
+        # Earliest arrival among the journeys of exactly `hops` connections : every such journey
+        # only takes links getting one hop closer to dest, so they are explored layer by layer
+        arrivals = {src: datetime}
+        parents = {src: None}
+        layer = [src]
+        (settled, relaxed) = (0, 0)
+        for remaining in range(hops - 1, -1, -1):
+            reached = {}
+            settled += len(layer)
+            for node in layer:
+                for edge in self.getOutEdges(node, arrivals[node]):
+                    relaxed += 1
+                    if not edge.weight[4] & services or self.hops.distance(edge.dest, dest) != remaining:
+                        continue
+                    if edge.dest not in reached or edge.weight[1] < arrivals[edge.dest]:
+                        arrivals[edge.dest] = edge.weight[1]
+                        parents[edge.dest] = edge
+                        reached[edge.dest] = True
+            if len(reached) == 0:
+                Graph.__count(stats, settled, relaxed)
+                return None # no departure left in time along these links
+            layer = list(reached)
+        Graph.__count(stats, settled, relaxed)
 
-            return edges_of_node_src 
-        
-        return self.djikstra(src, dest, datetime, lambda_process_edge)
+        path = []
+        node = dest
+        while parents[node] is not None:
+            path.append(parents[node])
+            node = parents[node].src
+        return path[::-1]
     
-    def foremost(self, src, dest, datetime):
-        def lambda_process_edge(distances, current_node, datetime):
-            # weight => (start, end, weight, line)
-            current_time = datetime if len(distances[current_node]) == 0 else distances[current_node][-1].weight[0]
-            edges = list(filter(lambda edge: edge.weight[1] <= current_time, self.edges)) # remove edges that are not available
-            edges = list(map(lambda edge : Edge(edge.dest, edge.src, [edge.weight[1], edge.weight[0], edge.weight[2], edge.weight[3]]), edges)) # reverse edges
-            edges = list(filter(lambda edge: edge.src == current_node, edges)) # remove edges that not src node
-
-            for edge in edges:
-                edge.weight[2] = abs((edge.weight[1] - current_time).total_seconds()) # waiting + trajet
-
-            return edges 
+    def fastest(self, src, dest, datetime, astar=False, stats=None, services=ALL):
+        def lambda_process_edge(current_node, current_time):
+            edges_of_node_src = self.getOutEdges(current_node, current_time) # only edges that are still available
+            return [(edge, edge.weight[1] - current_time) for edge in edges_of_node_src if edge.weight[4] & services] # waiting + trajet
         
-        return self.djikstra(dest, src, datetime, lambda_process_edge)
+        bounds = self.rides.toward(dest) if astar else None # minimum riding time left to dest
+        heuristic = (lambda node: bounds.get(node.data.name)) if astar else None
+        return self.djikstra(src, dest, datetime, lambda_process_edge, heuristic, stats)
+    
+    def foremost(self, src, dest, datetime, astar=False, stats=None, services=ALL):
+        # Arrive-by : latest departure from src still reaching dest at `datetime`, searched backwards
+        bounds = self.rides.awayFrom(src) if astar else None # minimum riding time from src
+        heuristic = (lambda node: bounds.get(node.data.name)) if astar else None
+        def lambda_process_edge(current_node, current_time):
+            # in-edges sorted by arrival, followed from their dest to their src : no reversed edge is built
+            edges_of_node_dest = self.getInEdges(current_node, current_time) # only edges arriving in time
+            return [(edge, current_time - edge.weight[0]) for edge in edges_of_node_dest if edge.weight[4] & services] # waiting + trajet
 
-    def djikstra(self, src, dest, datetime, lambda_process_edge):
-        current_node = src
-        nodes_toVisited = list(filter(lambda node: node != src, self.nodes))
-        visited = [src]
-        distances = {}
-        for node in self.nodes:
-            distances[node] = None if node != src else []
-            
-        while len(nodes_toVisited) > 0:
-            edges_of_node_src = lambda_process_edge(distances, current_node, datetime)
-            
-            for node in self.nodes:
-                edges_of_node_dest = list(filter(lambda edge: edge.dest == node, edges_of_node_src))
-                if len(edges_of_node_dest) == 0:
+        # Labels : cost = datetime - latest departure from the node, parent edge leading towards dest
+        (times, parents) = self.__search(dest, src, datetime, lambda_process_edge, heuristic, stats, follow=lambda edge: (edge.src, edge.weight[0]))
+        if src not in parents:
+            return None
+
+        # Only the edges of the journey are reversed : weight => (start, end, waiting + trajet, line), from dest back to src
+        path = []
+        node = src
+        while parents[node] is not None:
+            path.append(parents[node])
+            node = parents[node].dest
+        edges = []
+        current_time = datetime
+        for edge in path[::-1]:
+            edges.append(Edge(edge.dest, edge.src, [edge.weight[1], edge.weight[0], current_time - edge.weight[0], edge.weight[3]]))
+            current_time = edge.weight[0]
+        return edges
+
+    def isochrone(self, src, datetime, budget=None, stats=None, services=ALL):
+        # Earliest arrival at every station reachable from src, within `budget` minutes when given : one search for all of them
+        def lambda_process_edge(current_node, current_time):
+            edges_of_node_src = self.getOutEdges(current_node, current_time) # only edges that are still available
+            return [(edge, edge.weight[1] - current_time) for edge in edges_of_node_src if edge.weight[4] & services] # waiting + trajet
+
+        (times, _) = self.__search(src, None, datetime, lambda_process_edge, None, stats, budget)
+        return { node: time for (node, time) in times.items() if node != src }
+
+    def route(self, algorithm, engine, src, dest, datetime, services=ALL, stats=None):
+        # One query on any engine : djikstra and astar search the graph itself, the others are its lazy engines.
+        # stats : search effort, filled by the graph searches only
+        if engine in ["djikstra", "astar"]:
+            return getattr(self, algorithm)(src, dest, datetime, astar=engine == "astar", stats=stats, services=services)
+        return getattr(getattr(self, engine), algorithm)(src, dest, datetime, services=services)
+
+    def batch(self, queries, algorithm="fastest", engine="djikstra", processes=None, services=ALL):
+        # queries => [(src, dest, datetime), ...], answered by a process pool in input order
+        return batch.run(self, [(services, algorithm, engine, src, dest, datetime) for (src, dest, datetime) in queries], processes)
+
+    def djikstra(self, src, dest, datetime, lambda_process_edge, heuristic=None, stats=None):
+        (times, parents) = self.__search(src, dest, datetime, lambda_process_edge, heuristic, stats)
+        if dest not in parents:
+            return None
+        path = []
+        node = dest
+        while parents[node] is not None:
+            path.append(parents[node])
+            node = parents[node].src
+        return path[::-1]
+
+    def __search(self, src, dest, datetime, lambda_process_edge, heuristic=None, stats=None, budget=None, follow=None):
+        # Labels : cost and time at each reached node, parent edge to rebuild the path.
+        # heuristic(node) : consistent lower bound on the cost left to dest (A*), None when dest is out of reach.
+        # dest None : one-to-all, the search runs until every node costing at most `budget` is settled
+        # follow(edge) => (next node, time there) : forward by default, (edge.src, departure) searches backwards
+        heuristic = heuristic or (lambda node: 0)
+        follow = follow or (lambda edge: (edge.dest, edge.weight[1]))
+        if heuristic(src) is None:
+            return ({}, {})
+        costs = {src: 0}
+        times = {src: datetime}
+        parents = {src: None}
+        visited = set()
+        counter = itertools.count() # tie-breaker, nodes are not comparable
+        heap = [(heuristic(src), datetime, next(counter), src)]
+        relaxed = 0
+        filtering = 0 # seconds spent in lambda_process_edge, the rest of the loop is relaxation
+        start = perf_counter()
+
+        while len(heap) > 0:
+            (_, _, _, current_node) = heapq.heappop(heap)
+            if current_node in visited:
+                continue # outdated entry
+            visited.add(current_node)
+            if current_node == dest:
+                break # settled : its label can't improve any more
+            (cost, time) = (costs[current_node], times[current_node])
+
+            filterStart = perf_counter()
+            edges = lambda_process_edge(current_node, time)
+            filtering += perf_counter() - filterStart
+            for (edge, weight) in edges:
+                relaxed += 1
+                (node, arrival) = follow(edge)
+                if node in visited:
                     continue
+                label = (cost + weight, arrival)
+                if budget is not None and label[0] > budget:
+                    continue # out of the budget
+                if dest in costs and label[0] > costs[dest]:
+                    continue # already worse than the label of dest, it can't lead to a better one
+                if node not in costs or label < (costs[node], times[node]):
+                    estimate = heuristic(node)
+                    if estimate is None:
+                        continue # dest can't be reached from there
+                    (costs[node], times[node]) = label
+                    parents[node] = edge
+                    heapq.heappush(heap, (label[0] + estimate, label[1], next(counter), node))
 
-                min_edge = min(edges_of_node_dest, key=lambda edge: edge.weight[2])
-                if distances[node] is None:
-                    distances[node] = distances[current_node] + [min_edge]
-                else:
-                    total_weight_current = sum([edge.weight[2] for edge in distances[current_node]]) + min_edge.weight[2]
-                    total_weight_node = sum([edge.weight[2] for edge in distances[node]])
-                    if total_weight_current < total_weight_node:
-                        distances[node] = distances[current_node] + [min_edge]
-                
-            to_visited_weight = {}
-            for node in nodes_toVisited:
-                if distances[node] is None:
-                    to_visited_weight[node] = float('inf')
-                else:
-                    to_visited_weight[node] = sum([edge.weight[2] for edge in distances[node]])
-
-            current_node = min(to_visited_weight, key=lambda node: to_visited_weight[node])
-            visited += [current_node]
-            nodes_toVisited.remove(current_node)
-        
-        return distances[dest]
\ No newline at end of file
+        Graph.__count(stats, len(visited), relaxed, filtering, perf_counter() - start - filtering)
+        return (times, parents)
@@ -0,0 +1,43 @@
+from array import array
+from collections import deque
+
+UNREACHABLE = 255
+FAR = 254 # at least FAR connections : deeper than a byte can count
+
+class HopMatrix:
+    def __init__(self, edges=[]):
+        # Fewest connections between every pair of stations over the static topology
+        # (a link exists as soon as one departure joins two stations), whatever the time.
+        # hops[s * n + d] : one byte per pair, UNREACHABLE when d can't be reached from s, FAR from FAR hops on
+        self.ids = {}
+        neighbours = []
+        for edge in edges:
+            for name in [edge.src.data.name, edge.dest.data.name]:
+                if name not in self.ids:
+                    self.ids[name] = len(self.ids)
+                    neighbours.append(set())
+            neighbours[self.ids[edge.src.data.name]].add(self.ids[edge.dest.data.name])
+
+        n = len(self.ids)
+        self.size = n
+        self.hops = array('B', [UNREACHABLE]) * (n * n)
+        for s in range(n):
+            row = s * n
+            self.hops[row + s] = 0
+            queue = deque([s])
+            while len(queue) > 0:
+                u = queue.popleft()
+                for v in neighbours[u]:
+                    if self.hops[row + v] == UNREACHABLE:
+                        self.hops[row + v] = min(self.hops[row + u] + 1, FAR) # still a lower bound once capped
+                        queue.append(v)
+
+    def distance(self, src, dest):
+        # Lower bound on the connections of any journey from src to dest, None when there is none.
+        # Exact below FAR, FAR only tells the pair is at least that far apart
+        if src == dest:
+            return 0
+        (s, d) = (self.ids.get(src.data.name), self.ids.get(dest.data.name))
+        if s is None or d is None or self.hops[s * self.size + d] == UNREACHABLE:
+            return None
+        return self.hops[s * self.size + d]
@@ -0,0 +1,66 @@
+import time
+from utils.networks.graph import Graph
+from utils.networks.node import Node
+from utils.networks.edge import Edge
+from entity.station import Station
+from utils.services import BITS
+
+REQUEST_GETALL_STATIONS = """
+    SELECT s.name FROM Station s;
+"""
+
+# Every service in one query, times converted to minutes since midnight by SQLite
+REQUEST_GETALL_DEPARTURES = """
+    SELECT s1.name, s2.name, l.name,
+        CAST(strftime('%H', d.src_datetime) AS INTEGER) * 60 + CAST(strftime('%M', d.src_datetime) AS INTEGER),
+        CAST(strftime('%H', d.dest_datetime) AS INTEGER) * 60 + CAST(strftime('%M', d.dest_datetime) AS INTEGER),
+        d.is_we_holidays
+    FROM Departure d
+    JOIN Station s1 on s1.id_station = d.id_src
+    JOIN Station s2 on s2.id_station = d.id_dest
+    JOIN Line l ON l.id_line = d.id_line;
+"""
+
+REQUEST_GETALL_PASS = """
+    SELECT s.name, l.name, p.number FROM Pass p
+    JOIN Station s on s.id_station = p.id_station
+    JOIN Line l ON l.id_line = p.id_line;
+"""
+
+def loadGraph(db):
+    # Returns the graph of every service and the time spent in each phase (seconds)
+    timings = {}
+    start = time.perf_counter()
+    def phase(name):
+        nonlocal start
+        now = time.perf_counter()
+        timings[name] = now - start
+        start = now
+
+    stations = db.execute(REQUEST_GETALL_STATIONS, ())
+    departures = db.execute(REQUEST_GETALL_DEPARTURES, ())
+    datas = db.execute(REQUEST_GETALL_PASS, ())
+    phase("query")
+
+    nodes = {name: Node(Station(name)) for (name,) in stations}
+    phase("nodes")
+
+    # One edge per departure, whatever the services it runs on : weight => [start, end, cost, line, services]
+    edges = {}
+    for (src, dest, line, s_minutes, d_minutes, isWeHolidays) in departures:
+        bit = BITS['we_holidays' if isWeHolidays else 'regular']
+        key = (src, dest, line, s_minutes, d_minutes)
+        if key in edges:
+            edges[key].weight[4] |= bit
+        else:
+            edges[key] = Edge(nodes[src], nodes[dest], [s_minutes, d_minutes, None, line, bit])
+    phase("edges")
+
+    passes = {}
+    for data in datas:
+        passes.setdefault(data[1], {})[data[0]] = data[2]
+    phase("passes")
+
+    graph = Graph(list(nodes.values()), list(edges.values()), passes)
+    phase("index")
+    return (graph, timings)
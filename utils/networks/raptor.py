@@ -0,0 +1,139 @@
+import bisect
+from utils.services import ALL, BITS
+
+class Route:
+    def __init__(self, stops, trips, service):
+        # Trips of one service sharing the same stop sequence, sorted by departure time
+        self.stops = stops
+        self.service = service # bit of the service running the trips
+        self.trips = sorted(trips, key=lambda trip: trip[0].weight[0])
+        # departures[pos] : departure time of each trip at stop `pos`
+        self.departures = [[trip[pos].weight[0] for trip in self.trips] for pos in range(len(stops) - 1)]
+
+    def earliestTrip(self, pos, time):
+        # Index of the first trip that can be boarded at stop `pos` after `time`
+        if pos >= len(self.departures):
+            return None
+        index = bisect.bisect_left(self.departures[pos], time)
+        return index if index < len(self.trips) else None
+
+class Raptor:
+    def __init__(self, edges=[], passes={}):
+        # Group connections by service, line and direction (order of the stations in Pass) :
+        # trips and routes are built per service, a connection running on several services belongs to one trip of each
+        groups = {}
+        for edge in edges:
+            line = edge.weight[3]
+            numbers = passes.get(line, {})
+            direction = None
+            if edge.src.data.name in numbers and edge.dest.data.name in numbers:
+                direction = numbers[edge.dest.data.name] > numbers[edge.src.data.name]
+            for bit in BITS.values():
+                if edge.weight[4] & bit:
+                    groups.setdefault((bit, line, direction), []).append(edge)
+
+        tripsOfStops = {}
+        for ((bit, line, direction), connections) in groups.items():
+            for trip in Raptor.__chainTrips(connections):
+                stops = tuple([trip[0].src] + [edge.dest for edge in trip])
+                tripsOfStops.setdefault((stops, bit), []).append(trip)
+
+        self.routes = [Route(stops, trips, bit) for ((stops, bit), trips) in tripsOfStops.items()]
+        self.routesOfStop = {}
+        for route in self.routes:
+            for (pos, stop) in enumerate(route.stops):
+                self.routesOfStop.setdefault(stop, []).append((route, pos))
+
+    def __chainTrips(connections):
+        # A bus arriving at a stop leaves it at the same time : chain connections into trips
+        following = {}
+        for edge in connections:
+            following.setdefault((edge.src, edge.weight[0]), []).append(edge)
+
+        chained = set()
+        successors = {}
+        for edge in connections:
+            for candidate in following.get((edge.dest, edge.weight[1]), []):
+                if id(candidate) in chained or candidate.dest == edge.src:
+                    continue
+                successors[id(edge)] = candidate
+                chained.add(id(candidate))
+                break
+
+        trips = []
+        for edge in connections:
+            if id(edge) in chained:
+                continue # not the first connection of a trip
+            trip = [edge]
+            while id(trip[-1]) in successors:
+                trip.append(successors[id(trip[-1])])
+            trips.append(trip)
+        return trips
+
+    def pareto(self, src, dest, datetime, maxTransfers=4, services=ALL):
+        # labels[k][stop] : earliest arrival at stop with at most k trips
+        labels = [{src: datetime}]
+        parents = [{}]
+        best = {src: datetime}
+        marked = {src}
+
+        for k in range(1, maxTransfers + 2):
+            labels.append(dict(labels[k - 1]))
+            parents.append(dict(parents[k - 1]))
+
+            # Routes serving a marked stop, scanned from the first marked stop
+            queue = {}
+            for stop in marked:
+                for (route, pos) in self.routesOfStop.get(stop, []):
+                    if not route.service & services:
+                        continue # not running that day
+                    if route not in queue or pos < queue[route]:
+                        queue[route] = pos
+            marked = set()
+
+            for (route, start) in queue.items():
+                trip = None
+                boarding = None
+                for pos in range(start, len(route.stops)):
+                    stop = route.stops[pos]
+                    if trip is not None:
+                        arrival = route.trips[trip][pos - 1].weight[1]
+                        improves = stop not in best or arrival < best[stop]
+                        if improves and (dest not in best or arrival < best[dest]): # target pruning
+                            labels[k][stop] = arrival
+                            parents[k][stop] = (k, route, trip, boarding, pos)
+                            best[stop] = arrival
+                            marked.add(stop)
+
+                    # Catch an earlier trip if the stop was reached in the previous round
+                    if stop in labels[k - 1]:
+                        earliest = route.earliestTrip(pos, labels[k - 1][stop])
+                        if earliest is not None and (trip is None or earliest < trip):
+                            trip = earliest
+                            boarding = pos
+
+            if len(marked) == 0:
+                break
+
+        # One journey per number of transfers, kept only when it arrives earlier
+        journeys = []
+        for k in range(1, len(labels)):
+            if src == dest or dest not in labels[k]:
+                continue
+            if len(journeys) > 0 and labels[k][dest] >= journeys[-1]["arrival"]:
+                continue
+            journeys.append({
+                "transfers": k - 1,
+                "arrival": labels[k][dest],
+                "journey": self.__journey(parents, k, dest)
+            })
+        return journeys
+
+    def __journey(self, parents, k, stop):
+        legs = []
+        while k > 0 and stop in parents[k]:
+            (round, route, trip, boarding, alighting) = parents[k][stop]
+            legs = route.trips[trip][boarding:alighting] + legs
+            stop = route.stops[boarding]
+            k = round - 1
+        return legs
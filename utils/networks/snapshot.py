@@ -0,0 +1,85 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+from utils.networks.timetable import Timetable, COLUMNS
+
+# Binary timetable snapshot, one section per graph :
+#   header  : magic, format version, fingerprint of the database it was compiled from, section count
+#   section : name, station table, line table, then every Timetable column (4-byte aligned)
+MAGIC = b"BUSSNAP\0"
+VERSION = 2
+HEADER = struct.Struct("<8sIQQI")
+TYPECODES = { "departures": 'H', "arrivals": 'H', "sortedArrivals": 'H' } # other columns are 'I'
+
+def fingerprint(database):
+    # Changes whenever SQLite writes to the database (the WAL file included, unless empty :
+    # every connection opens one, it holds no change until the first write)
+    (mtime, size) = (0, 0)
+    for path in [database, database + "-wal"]:
+        if os.path.exists(path) and (path == database or os.path.getsize(path) > 0):
+            stat = os.stat(path)
+            (mtime, size) = (max(mtime, stat.st_mtime_ns), size + stat.st_size)
+    return (mtime, size)
+
+def _pad(data):
+    return data + b"\0" * (-len(data) % 4)
+
+def _blob(data):
+    return struct.pack("<I", len(data)) + _pad(data)
+
+def compile(graphs, database, path):
+    # graphs => { name : Graph } freshly loaded from `database`
+    (mtime, size) = fingerprint(database)
+    content = [HEADER.pack(MAGIC, VERSION, mtime, size, len(graphs))]
+    for (type, graph) in graphs.items():
+        timetable = graph.timetable
+        content.append(_blob(type.encode("utf-8")))
+        content.append(_blob("\0".join(timetable.stations).encode("utf-8")))
+        content.append(_blob("\0".join(timetable.lines).encode("utf-8")))
+        for name in COLUMNS:
+            content.append(_blob(array(TYPECODES.get(name, 'I'), getattr(timetable, name)).tobytes()))
+
+    with open(path + ".tmp", "wb") as f:
+        f.write(b"".join(content))
+    os.replace(path + ".tmp", path) # never leave a half-written snapshot behind
+
+def load(path, database):
+    # { name : Timetable } routing straight on the mapped file, None when missing or stale
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(buffer)
+
+    (magic, version, mtime, size, count) = HEADER.unpack_from(view, 0)
+    if magic != MAGIC or version != VERSION or (mtime, size) != fingerprint(database):
+        return None
+
+    offset = HEADER.size
+    def blob():
+        nonlocal offset
+        (length,) = struct.unpack_from("<I", view, offset)
+        data = view[offset + 4 : offset + 4 + length]
+        offset += 4 + length + (-length % 4)
+        return data
+
+    timetables = {}
+    for _ in range(count):
+        type = str(blob(), "utf-8")
+        stations = str(blob(), "utf-8").split("\0")
+        lines = str(blob(), "utf-8").split("\0")
+        columns = {name: blob().cast(TYPECODES.get(name, 'I')) for name in COLUMNS}
+        timetables[type] = Timetable.fromColumns([] if stations == [""] else stations, [] if lines == [""] else lines, columns)
+    return timetables
+
+if __name__ == "__main__":
+    # python -m utils.networks.snapshot [database] [snapshot]
+    from entity.db import DB
+    from utils.networks.loader import loadGraph
+    database = sys.argv[1] if len(sys.argv) > 1 else "./data/database/database.db"
+    path = sys.argv[2] if len(sys.argv) > 2 else "./data/database/timetable.snapshot"
+    (graph, timings) = loadGraph(DB("", database))
+    compile({"network": graph}, database, path)
+    print(f"Snapshot written to {path} ({os.path.getsize(path)} bytes)")
@@ -0,0 +1,59 @@
+import random
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from api import ALGORITHMS
+from entity.db import DB
+from utils.encoder import CustomEncoder
+from utils.networks.loader import loadGraph
+from utils.services import BITS
+import json
+
+# Concurrent mixed queries must give the same answers as the same queries run one after the other,
+# and every profile entry must arrive as early as the fastest journey leaving at its departure.
+# python -m utils.networks.stress [queries] [threads]
+
+def route(graph, query):
+    (services, engine, algorithm, src, dest, time) = query
+    return json.dumps(graph.route(algorithm, engine, src, dest, time, services), cls=CustomEncoder)
+
+def stress(graph, count=2000, threads=16, seed=631):
+    generator = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        services = generator.choice(list(BITS.values()))
+        engine = generator.choice(list(ALGORITHMS.keys()))
+        (src, dest) = generator.sample(graph.nodes, 2)
+        queries.append((services, engine, generator.choice(ALGORITHMS[engine]), src, dest, generator.randrange(5 * 60, 21 * 60)))
+
+    serial = [route(graph, query) for query in queries]
+    with ThreadPoolExecutor(threads) as executor:
+        concurrent = list(executor.map(lambda query: route(graph, query), queries))
+    return [query for (query, a, b) in zip(queries, serial, concurrent) if a != b]
+
+def profiles(graph, count=400, window=60, seed=631):
+    # (query, entry) for each CSA profile entry that another journey dominates
+    generator = random.Random(seed)
+    mismatches = []
+    for _ in range(count):
+        services = generator.choice(list(BITS.values()))
+        (src, dest) = generator.sample(graph.nodes, 2)
+        start = generator.randrange(5 * 60, 21 * 60)
+        for entry in graph.csa.profile(src, dest, start, start + window, services):
+            fastest = graph.csa.fastest(src, dest, entry["departure"], services)
+            if fastest is None or fastest[-1].weight[1] != entry["arrival"] or not start <= entry["departure"] <= start + window:
+                mismatches.append(((services, src, dest, start, start + window), (entry["departure"], entry["arrival"])))
+    return mismatches
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    (graph, timings) = loadGraph(DB("./data/", "database/database.db"))
+    mismatches = stress(graph, count, threads)
+    print(f"{count} queries on {threads} threads : {len(mismatches)} mismatches")
+    for query in mismatches[:10]:
+        print(query)
+    dominated = profiles(graph, count // 5)
+    print(f"{count // 5} profiles : {len(dominated)} dominated entries")
+    for (query, entry) in dominated[:10]:
+        print(query, entry)
+    sys.exit(1 if len(mismatches) + len(dominated) > 0 else 0)
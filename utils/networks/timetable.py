@@ -0,0 +1,187 @@
+from array import array
+import bisect
+import heapq
+from utils.clock import formatMinutes
+from utils.networks.node import Node
+from entity.station import Station
+from utils.services import ALL
+
+# Columns of a Timetable, in the order they are stored in a snapshot
+COLUMNS = ["departures", "arrivals", "srcs", "dests", "connectionLines", "services", "byArrival", "sortedArrivals", "outConnections", "outOffsets"]
+
+class Connection:
+    # View over one connection of a Timetable, serialised like an Edge
+    __slots__ = ("timetable", "index", "reversed")
+
+    def __init__(self, timetable, index, reversed=False):
+        self.timetable = timetable
+        self.index = index
+        self.reversed = reversed # foremost journeys are given from dest back to src
+
+    def __str__(self):
+        data = self.to_dict()
+        return f"({data['src']['name']}, {data['dest']['name']}, {data['other']})"
+    def __repr__(self):
+        return f"{self}"
+
+    def to_dict(self):
+        timetable = self.timetable
+        (src, dest) = (timetable.srcs[self.index], timetable.dests[self.index])
+        (start, end) = (timetable.departures[self.index], timetable.arrivals[self.index])
+        if self.reversed:
+            (src, dest, start, end) = (dest, src, end, start)
+        return {
+            "src": { "name": timetable.stations[src] },
+            "dest": { "name": timetable.stations[dest] },
+            "other": {
+                "start": formatMinutes(start),
+                "end": formatMinutes(end),
+                "line": timetable.lines[timetable.connectionLines[self.index]]
+            }
+        }
+
+class Timetable:
+    def __init__(self, edges=[], version=0):
+        # Integer ids for stations and lines, one column per field, connections sorted by departure
+        self.version = version
+        self.stations = [] # id => name
+        self.lines = [] # id => name
+        self.stationIds = {}
+        self.lineIds = {}
+        for edge in edges:
+            for name in [edge.src.data.name, edge.dest.data.name]:
+                if name not in self.stationIds:
+                    self.stationIds[name] = len(self.stations)
+                    self.stations.append(name)
+            if edge.weight[3] not in self.lineIds:
+                self.lineIds[edge.weight[3]] = len(self.lines)
+                self.lines.append(edge.weight[3])
+
+        edges = sorted(edges, key=lambda edge: edge.weight[0])
+        self.departures = array('H', [edge.weight[0] for edge in edges])
+        self.arrivals = array('H', [edge.weight[1] for edge in edges])
+        self.srcs = array('I', [self.stationIds[edge.src.data.name] for edge in edges])
+        self.dests = array('I', [self.stationIds[edge.dest.data.name] for edge in edges])
+        self.connectionLines = array('I', [self.lineIds[edge.weight[3]] for edge in edges])
+        self.services = array('I', [edge.weight[4] for edge in edges]) # bitmask of the services running the connection
+        self.buildIndex()
+
+    def buildIndex(self):
+        # byArrival : connection ids sorted by arrival, for backward scans
+        # outConnections[outOffsets[s]:outOffsets[s + 1]] : connections leaving station s, by departure
+        count = len(self.departures)
+        self.byArrival = array('I', sorted(range(count), key=lambda i: self.arrivals[i]))
+        self.sortedArrivals = array('H', [self.arrivals[i] for i in self.byArrival])
+        self.outConnections = array('I', sorted(range(count), key=lambda i: self.srcs[i]))
+        self.outOffsets = array('I', [0] * (len(self.stations) + 1))
+        for i in range(count):
+            self.outOffsets[self.srcs[i] + 1] += 1
+        for s in range(len(self.stations)):
+            self.outOffsets[s + 1] += self.outOffsets[s]
+
+    def fromColumns(stations, lines, columns, version=0):
+        # Timetable over existing columns (arrays or memoryviews), nothing is sorted nor copied
+        timetable = Timetable.__new__(Timetable)
+        timetable.version = version
+        timetable.stations = stations
+        timetable.lines = lines
+        timetable.stationIds = {name: id for (id, name) in enumerate(stations)}
+        timetable.lineIds = {name: id for (id, name) in enumerate(lines)}
+        for name in COLUMNS:
+            setattr(timetable, name, columns[name])
+        return timetable
+
+    def getNode(self, data):
+        return Node(Station(data)) if data in self.stationIds else None
+
+    def route(self, algorithm, engine, src, dest, time, services=ALL, stats=None):
+        # Same call as Graph.route, for the timetable mapped from a snapshot : engine is always "timetable"
+        return getattr(self, algorithm)(src, dest, time, services=services)
+
+    def __ids(self, src, dest):
+        return (self.stationIds.get(src.data.name), self.stationIds.get(dest.data.name))
+
+    def __path(self, parents, node, following):
+        path = []
+        while parents[node] >= 0:
+            path.append(parents[node])
+            node = following[parents[node]]
+        return path
+
+    def fastest(self, src, dest, time, services=ALL):
+        (s, d) = self.__ids(src, dest)
+        if s is None or d is None:
+            return None
+        arrivals = [None] * len(self.stations)
+        parents = [-1] * len(self.stations)
+        arrivals[s] = time
+        for i in range(bisect.bisect_left(self.departures, time), len(self.departures)):
+            departure = self.departures[i]
+            if arrivals[d] is not None and departure >= arrivals[d]:
+                break
+            u = self.srcs[i]
+            if arrivals[u] is None or arrivals[u] > departure or not self.services[i] & services:
+                continue
+            v = self.dests[i]
+            if v != s and (arrivals[v] is None or self.arrivals[i] < arrivals[v]):
+                arrivals[v] = self.arrivals[i]
+                parents[v] = i
+
+        if arrivals[d] is None:
+            return None
+        return [Connection(self, i) for i in self.__path(parents, d, self.srcs)[::-1]]
+
+    def foremost(self, src, dest, time, services=ALL):
+        (s, d) = self.__ids(src, dest)
+        if s is None or d is None:
+            return None
+        departures = [None] * len(self.stations)
+        parents = [-1] * len(self.stations)
+        departures[d] = time
+        for position in range(bisect.bisect_right(self.sortedArrivals, time) - 1, -1, -1):
+            i = self.byArrival[position]
+            if departures[s] is not None and self.arrivals[i] <= departures[s]:
+                break
+            v = self.dests[i]
+            if departures[v] is None or departures[v] < self.arrivals[i] or not self.services[i] & services:
+                continue
+            u = self.srcs[i]
+            if u != d and (departures[u] is None or self.departures[i] > departures[u]):
+                departures[u] = self.departures[i]
+                parents[u] = i
+
+        if departures[s] is None:
+            return None
+        return [Connection(self, i, reversed=True) for i in self.__path(parents, s, self.dests)[::-1]]
+
+    def shortest(self, src, dest, time, services=ALL):
+        # Fewest connections, ties broken by the earliest arrival
+        (s, d) = self.__ids(src, dest)
+        if s is None or d is None:
+            return None
+        labels = [None] * len(self.stations)
+        parents = [-1] * len(self.stations)
+        visited = [False] * len(self.stations)
+        labels[s] = (0, time)
+        heap = [(0, time, s)]
+        while len(heap) > 0:
+            (hops, arrival, u) = heapq.heappop(heap)
+            if visited[u]:
+                continue
+            visited[u] = True
+            (low, high) = (self.outOffsets[u], self.outOffsets[u + 1])
+            first = bisect.bisect_left(self.outConnections, arrival, low, high, key=lambda i: self.departures[i])
+            for position in range(first, high):
+                i = self.outConnections[position]
+                if not self.services[i] & services:
+                    continue
+                v = self.dests[i]
+                label = (hops + 1, self.arrivals[i])
+                if not visited[v] and (labels[v] is None or label < labels[v]):
+                    labels[v] = label
+                    parents[v] = i
+                    heapq.heappush(heap, (label[0], label[1], v))
+
+        if labels[d] is None:
+            return None
+        return [Connection(self, i) for i in self.__path(parents, d, self.srcs)[::-1]]
@@ -0,0 +1,114 @@
+import ast
+import glob
+import re
+import sqlite3
+import sys
+
+# Query plan regression check : every filtered statement touching Departure must use an index,
+# and the keyset listings must read their rows in page order (no sort before the first row).
+#   python -m utils.queryplan [database]
+# Statements are the REQUEST_* strings of the SOURCES and the statements of the SQL SCRIPTS.
+# A request listed with a filter_params dict is built by api.filterQuery, as its endpoint runs it :
+# with each filter on its own, then with the keyset cursor too, ordered and limited.
+SOURCES = ["api.py", "utils/networks/loader.py"]
+SCRIPTS = "data/database/script/*.sql"
+MIGRATIONS = "./data/database/migrations/"
+TABLE = "Departure"
+CURSOR = "after"
+
+def literal(node):
+    # Python value of a constant dict of the source, None when not constant
+    try:
+        return ast.literal_eval(node)
+    except ValueError:
+        return None
+
+def statements(source):
+    # (name, sql, parameters) for each REQUEST_* constant, built with the filters of the same function
+    from api import filterQuery
+    with open(source, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    scopes = [node for node in ast.walk(tree) if isinstance(node, ast.FunctionDef)] + [tree]
+    seen = set()
+    for scope in scopes:
+        requests = {}
+        listing = None
+        for node in ast.walk(scope):
+            if isinstance(node, ast.Assign) and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str):
+                for target in node.targets:
+                    if isinstance(target, ast.Name) and target.id.startswith("REQUEST_") and id(node) not in seen:
+                        seen.add(id(node))
+                        requests[target.id] = node.value.value
+            if isinstance(node, ast.Assign) and any(isinstance(target, ast.Name) and target.id == "filter_params" for target in node.targets):
+                (keys, values) = (node.value.keys, node.value.values)
+                params = values[[key.value for key in keys].index("params")]
+                # values are read from the request : only the conditions and the order are constant
+                listing = {
+                    "params" : { key.value : literal(value.values[[k.value for k in value.keys].index("request")]) for (key, value) in zip(params.keys, params.values) },
+                    "order" : literal(values[[key.value for key in keys].index("order")])
+                }
+
+        for (name, sql) in requests.items():
+            if listing is None:
+                yield (f"{source}:{name}", sql, [None] * sql.count("?"))
+                continue
+            filters = [[]] + [[param] for param in listing["params"]] + [[param, CURSOR] for param in listing["params"] if param not in [CURSOR]]
+            for names in filters:
+                filter_params = {
+                    "params" : { param : { "value" : tuple([0] * where.count("?")) if param in names else None, "request" : where } for (param, where) in listing["params"].items() },
+                    "order" : listing["order"]
+                }
+                (request, params) = filterQuery(sql, filter_params, 100)
+                yield (f"{source}:{name} {' + '.join(names) or 'unfiltered'}", request, params)
+
+def scripts(pattern):
+    for path in sorted(glob.glob(pattern)):
+        with open(path, 'r', encoding='utf-8') as f:
+            for (number, sql) in enumerate(f.read().split(";")):
+                if sql.strip():
+                    yield (f"{path}#{number + 1}", sql)
+
+def aliases(sql):
+    # Names under which TABLE appears in the statement
+    names = {TABLE}
+    for match in re.finditer(rf"\b{TABLE}\s+(?:AS\s+)?(\w+)", sql, re.IGNORECASE):
+        if match.group(1).upper() not in ["WHERE", "JOIN", "ON", "SET", "VALUES", "LIMIT"]:
+            names.add(match.group(1))
+    return names
+
+def check(conn, name, sql, params):
+    # Returns the plan and whether it scans TABLE although the statement filters it,
+    # or sorts the rows of a limited page before returning the first one
+    plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+    names = aliases(sql)
+    scans = [detail for detail in plan if detail.startswith("SCAN ") and detail.split(" ")[1] in names]
+    sorts = [detail for detail in plan if detail.startswith("USE TEMP B-TREE FOR") and "ORDER BY" in detail]
+    filtered = "WHERE" in sql.upper()
+    paged = "LIMIT" in sql.upper()
+    return (plan, (filtered and len(scans) > 0) or (paged and len(sorts) > 0))
+
+if __name__ == "__main__":
+    from entity.db import DB
+    database = sys.argv[1] if len(sys.argv) > 1 else "./data/database/database.db"
+    # Checked on a private copy : migrations are applied without touching the real database
+    conn = sqlite3.connect(":memory:")
+    sqlite3.connect(database).backup(conn)
+    db = DB("", ":memory:")
+    db.local.conn = conn
+    db.migrate(MIGRATIONS)
+
+    failures = 0
+    queries = [query for source in SOURCES for query in statements(source)]
+    queries += [(name, sql, []) for (name, sql) in scripts(SCRIPTS)] # arguments are inlined as "?" literals
+    for (name, sql, params) in queries:
+        if TABLE.upper() not in sql.upper() and "LIMIT" not in sql.upper():
+            continue
+        (plan, failed) = check(conn, name, sql, params)
+        failures += failed
+        print(f"{'FAIL' if failed else 'ok  '} {name}")
+        if failed:
+            for detail in plan:
+                print(f"       {detail}")
+
+    print(f"{len(queries)} statements checked, {failures} full scan(s) of {TABLE} or sorted page(s)")
+    sys.exit(1 if failures > 0 else 0)
@@ -0,0 +1,32 @@
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.serving import BaseWSGIServer
+
+class PooledWSGIServer(BaseWSGIServer):
+    # Requests are handled by a fixed pool of threads instead of one thread per connection
+    def __init__(self, host, port, app, workers=8):
+        super().__init__(host, port, app)
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="request")
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.__handle, request, client_address)
+
+    def __handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False)
+
+def serve(app, host="127.0.0.1", port=5000, workers=8):
+    server = PooledWSGIServer(host, port, app, workers)
+    print(f"Serving on http://{host}:{port} with {workers} workers")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
@@ -0,0 +1,29 @@
+from functools import lru_cache
+import holidays
+import threading
+
+# Service calendars : each connection carries the bitmask of the services it runs on (weight[4]),
+# a date activates every service whose rule matches it. Adding a calendar adds a bit, not a graph.
+
+FRANCE = holidays.France() # one instance, the holidays of a year are computed on its first lookup
+LOCK = threading.Lock()
+
+def isWeHoliday(date):
+    with LOCK:
+        return date in FRANCE or date.weekday() in [5, 6] # Saturday or Sunday
+
+# name => rule, the order gives the bits : never reorder, append
+SERVICES = {
+    "regular" : lambda date: not isWeHoliday(date),
+    "we_holidays" : isWeHoliday
+}
+BITS = {name: 1 << i for (i, name) in enumerate(SERVICES)}
+ALL = sum(BITS.values())
+
+@lru_cache(maxsize=4096)
+def active(date):
+    # Bitmask of the services running on `date` (a datetime.date)
+    return sum(BITS[name] for (name, rule) in SERVICES.items() if rule(date))
+
+def names(mask):
+    return [name for (name, bit) in BITS.items() if mask & bit]